@@ -0,0 +1,223 @@
+"""Offline MixingAudioSource benchmark, Discord kapcsolat nelkul.
+
+Futtatas a repo gyokerebol:
+
+    python benchmarks/mixer_benchmark.py
+    python benchmarks/mixer_benchmark.py --overlays 0,1,4 --frames 5000 --json
+    python benchmarks/mixer_benchmark.py --slow-ms 4 --stall-every 200 --stall-ms 300 --realtime
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+# A core importja a bot teljes konfiguraciojat betolti; a benchmarkhoz eleg a dummy ertek.
+os.environ.setdefault("SPOTIPY_CLIENT_ID", "benchmark")
+os.environ.setdefault("SPOTIPY_CLIENT_SECRET", "benchmark")
+os.environ.setdefault("BOT_LOG_DIR", os.path.join(tempfile.gettempdir(), "discord-bot-benchmark-logs"))
+
+import discord  # noqa: E402
+
+from bot_app import core  # noqa: E402
+from bot_app.mixing import CHANNELS, FRAME_DURATION_MS, FRAME_SIZE, SAMPLE_RATE  # noqa: E402
+from bot_app.sfx_cache import MemoryPCMAudio  # noqa: E402
+
+
+SOURCE_SECONDS = 2
+FRAME_SECONDS = FRAME_DURATION_MS / 1000
+
+
+def sine_pcm(frequency: float, amplitude: float, seconds: float = SOURCE_SECONDS) -> bytes:
+    timeline = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    wave = np.sin(2 * np.pi * frequency * timeline) * amplitude * 32767
+    return np.repeat(wave.astype(np.int16), CHANNELS).tobytes()
+
+
+def noise_pcm(amplitude: float, seed: int, seconds: float = SOURCE_SECONDS) -> bytes:
+    generator = np.random.default_rng(seed)
+    samples = generator.standard_normal(int(SAMPLE_RATE * seconds) * CHANNELS) * amplitude * 32767
+    return np.clip(samples, -32768, 32767).astype(np.int16).tobytes()
+
+
+class SyntheticDecoderSource(discord.AudioSource):
+    # Dekodert utanzo forras: a mixer ring bufferen es reader szalon at olvassa, mint az ffmpeg-et.
+    def __init__(self, pcm: bytes, *, read_delay_ms: float = 0.0, stall_every: int = 0, stall_ms: float = 0.0):
+        self._pcm = pcm
+        self._position = 0
+        self._frames = 0
+        self.read_delay_seconds = read_delay_ms / 1000
+        self.stall_every = stall_every
+        self.stall_seconds = stall_ms / 1000
+
+    def read(self) -> bytes:
+        self._frames += 1
+        if self.stall_every and self._frames % self.stall_every == 0:
+            time.sleep(self.stall_seconds)
+        elif self.read_delay_seconds:
+            time.sleep(self.read_delay_seconds)
+        if self._position + FRAME_SIZE > len(self._pcm):
+            self._position = 0
+        chunk = self._pcm[self._position:self._position + FRAME_SIZE]
+        self._position += FRAME_SIZE
+        return chunk
+
+    def is_opus(self):
+        return False
+
+
+def build_main_source(args) -> discord.AudioSource:
+    pcm = sine_pcm(220.0, args.main_amplitude)
+    if args.slow_ms or args.stall_every:
+        source = SyntheticDecoderSource(
+            pcm, read_delay_ms=args.slow_ms, stall_every=args.stall_every, stall_ms=args.stall_ms
+        )
+    else:
+        source = MemoryPCMAudio(pcm, loop=True)
+    return discord.PCMVolumeTransformer(source, volume=args.gain)
+
+
+def build_overlay_source(index: int, args) -> discord.AudioSource:
+    return MemoryPCMAudio(noise_pcm(args.overlay_amplitude, seed=index), loop=True)
+
+
+def build_mixer(overlays: int, args) -> core.MixingAudioSource:
+    mixer = core.MixingAudioSource()
+    if args.no_limiter:
+        mixer._engine.limiter = None
+    mixer.set_main_source(build_main_source(args))
+    for index in range(overlays):
+        mixer.add_sfx(build_overlay_source(index, args))
+    return mixer
+
+
+def run_frames(mixer: core.MixingAudioSource, frames: int, *, realtime: bool) -> tuple[np.ndarray, int]:
+    durations = np.empty(frames, dtype=np.float64)
+    late_frames = 0
+    started_at = time.perf_counter()
+    for index in range(frames):
+        if realtime:
+            deadline = started_at + index * FRAME_SECONDS
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -FRAME_SECONDS:
+                late_frames += 1
+        frame_started_at = time.perf_counter()
+        mixer.read()
+        durations[index] = time.perf_counter() - frame_started_at
+    return durations, late_frames
+
+
+def measure_allocations(overlays: int, args) -> dict:
+    mixer = build_mixer(overlays, args)
+    run_frames(mixer, min(args.warmup, 50), realtime=False)
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        run_frames(mixer, args.alloc_frames, realtime=False)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        mixer.cleanup()
+    return {
+        "alloc_peak_kb": round((peak - baseline) / 1024, 1),
+        "alloc_retained_bytes_per_frame": round((current - baseline) / args.alloc_frames, 1),
+    }
+
+
+def run_scenario(overlays: int, args) -> dict:
+    mixer = build_mixer(overlays, args)
+    if args.slow_ms or args.stall_every:
+        # A reader szalnak ido kell, hogy megtoltse a ring buffert.
+        time.sleep(0.3)
+    run_frames(mixer, args.warmup, realtime=False)
+    wall_started_at = time.perf_counter()
+    durations, late_frames = run_frames(mixer, args.frames, realtime=args.realtime)
+    wall_seconds = time.perf_counter() - wall_started_at
+    stats = mixer.stats_snapshot()
+    mixer.cleanup()
+
+    durations_ms = durations * 1000
+    result = {
+        "overlays": overlays,
+        "frames": args.frames,
+        "frames_per_second": round(args.frames / wall_seconds, 1),
+        "realtime_factor": round(args.frames * FRAME_SECONDS / wall_seconds, 1),
+        "p50_ms": round(float(np.percentile(durations_ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(durations_ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(durations_ms, 99)), 4),
+        "max_ms": round(float(durations_ms.max()), 4),
+        "late_frames": late_frames,
+        "silence_frames": stats["silence_frames"],
+        "underruns": stats["underruns"],
+        "limiter_max_reduction_db": (stats["limiter"] or {}).get("max_gain_reduction_db"),
+    }
+    if not args.no_alloc:
+        result.update(measure_allocations(overlays, args))
+    return result
+
+
+def format_result(result: dict) -> str:
+    line = (
+        f"overlays={result['overlays']:<2} fps={result['frames_per_second']:>9} "
+        f"x{result['realtime_factor']:<7} p50={result['p50_ms']:.3f}ms p95={result['p95_ms']:.3f}ms "
+        f"p99={result['p99_ms']:.3f}ms max={result['max_ms']:.3f}ms "
+        f"late={result['late_frames']} underruns={result['underruns']}"
+    )
+    if "alloc_peak_kb" in result:
+        line += (
+            f" alloc_peak={result['alloc_peak_kb']}KB "
+            f"retained/frame={result['alloc_retained_bytes_per_frame']}B"
+        )
+    return line
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="MixingAudioSource benchmark szintetikus forrasokkal")
+    parser.add_argument("--overlays", default="0,1,4", help="vesszovel elvalasztott overlay szamok")
+    parser.add_argument("--frames", type=int, default=3000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--alloc-frames", type=int, default=500)
+    parser.add_argument("--gain", type=float, default=0.5, help="a fo forras hangereje")
+    parser.add_argument("--main-amplitude", type=float, default=0.8)
+    parser.add_argument("--overlay-amplitude", type=float, default=0.3)
+    parser.add_argument("--slow-ms", type=float, default=0.0, help="a fo forras read() kesleltetese")
+    parser.add_argument("--stall-every", type=int, default=0, help="minden N. frame-nel akadas")
+    parser.add_argument("--stall-ms", type=float, default=0.0)
+    parser.add_argument("--realtime", action="store_true", help="valos 20 ms-os utemezes")
+    parser.add_argument("--no-limiter", action="store_true")
+    parser.add_argument("--no-alloc", action="store_true", help="tracemalloc meres kihagyasa")
+    parser.add_argument("--json", action="store_true")
+    return parser.parse_args(argv)
+
+
+async def run(args) -> list[dict]:
+    # Az add_sfx/set_main_source completion future-t ad vissza, ehhez futo event loop kell.
+    overlay_counts = [int(value) for value in args.overlays.split(",") if value.strip()]
+    return [run_scenario(overlays, args) for overlays in overlay_counts]
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(format_result(result))
+
+
+if __name__ == "__main__":
+    main()
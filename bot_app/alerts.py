@@ -41,6 +41,25 @@ async def handle_share_video(request):
     except Exception as e:
         logger.exception("Failed to process /share-video request.")
         return web.Response(status=500, text=f"Failed to send message: {e}")
+
+
+async def handle_mixer_stats(request):
+    guild_id = str(request.query.get("guild_id") or "").strip()
+    stats = collect_mixer_stats()
+    if guild_id:
+        if guild_id not in stats:
+            return web.Response(status=404, text="No active mixer for this guild")
+        stats = {guild_id: stats[guild_id]}
+    return web.json_response(
+        {
+            "mixers": stats,
+            "ffmpeg": ffmpeg_budget.snapshot(),
+            "track_cache": track_cache.stats() if track_cache else None,
+            "metadata_cache": metadata_cache.stats() if metadata_cache else None,
+            "ytdl_pool": ytdl_pool.snapshot(),
+            "spotify_cache": spotify_resolver.stats(),
+        }
+    )
 
 
 def stop_radnai_alert() -> bool:
@@ -150,10 +169,14 @@ async def play_radnai_voice_alert(alert_sound_path: str, stop_event: asyncio.Eve
 
             await settle_voice_connection(connection_changed)
             mixer = get_mixer(voice_client)
-            mixer.add_sfx(build_sfx_source(alert_sound_path))
-
-            while mixer.has_sfx() and not stop_event.is_set():
-                await asyncio.sleep(1)
+            playback_done = mixer.add_sfx(
+                build_sfx_source(alert_sound_path, priority=FFmpegPriority.ALERT)
+            )
+            stop_waiter = asyncio.create_task(stop_event.wait())
+            try:
+                await asyncio.wait({playback_done, stop_waiter}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                stop_waiter.cancel()
 
             if stop_event.is_set() and (voice_client.is_playing() or voice_client.is_paused()):
                 voice_client.stop()
@@ -215,7 +238,7 @@ async def handle_radnai_alert(request):
         "\u26A0\uFE0F **Figyelem!** A radnaimark.hu jelenleg nem el\u00e9rhet\u0151 vagy "
         "r\u00f6vid ideig nem volt el\u00e9rhet\u0151"
     )
-    alert_sound_path = "/app/radnai_alert/radnai_alert.mp3"
+    alert_sound_path = os.path.join(RADNAI_ALERT_SOUNDS_DIR, "radnai_alert.mp3")
 
     chat_alert_sent = False
     chat_messages_sent = 0
@@ -314,6 +337,7 @@ async def start_internal_server():
             web.post("/scheduled-messages", handle_create_scheduled_message),
             web.put("/scheduled-messages/{message_id}", handle_update_scheduled_message),
             web.delete("/scheduled-messages/{message_id}", handle_delete_scheduled_message),
+            web.get("/mixer-stats", handle_mixer_stats),
             web.post("/share-video", handle_share_video),
             web.post("/alert-radnai", handle_radnai_alert),
         ]
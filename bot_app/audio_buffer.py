@@ -0,0 +1,224 @@
+import threading
+import time
+from typing import Optional
+
+import discord
+
+from bot_app.logging_setup import get_logger
+from bot_app.mixing import FRAME_DURATION_MS, FRAME_SIZE
+
+
+logger = get_logger(__name__)
+
+PCM_SILENCE = b"\x00" * FRAME_SIZE
+OPUS_SILENCE = b"\xf8\xff\xfe"
+READER_FULL_SLEEP_SECONDS = FRAME_DURATION_MS / 2000
+FRAMES_PER_SECOND = 1000 // FRAME_DURATION_MS
+# Ennyi ujratoltes egy ablakon belul mar ismetlodo akadasnak szamit, ilyenkor no a buffer.
+UNDERRUN_GROWTH_EVENTS = 2
+UNDERRUN_GROWTH_WINDOW_SECONDS = 30
+UNDERRUN_GROWTH_FACTOR = 1.5
+
+
+def seconds_to_frames(seconds: float) -> int:
+    return max(1, int(round(seconds * FRAMES_PER_SECOND)))
+
+
+class FrameRingBuffer:
+    # Single-producer / single-consumer gyuru: az iro csak a _tail-t, az olvaso csak a _head-et
+    # modositja, igy a GIL mellett nincs szukseg zarra.
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._slots: list = [None] * (self.capacity + 1)
+        self._head = 0
+        self._tail = 0
+
+    def __len__(self) -> int:
+        return (self._tail - self._head) % len(self._slots)
+
+    def push(self, item) -> bool:
+        tail = self._tail
+        next_tail = (tail + 1) % len(self._slots)
+        if next_tail == self._head:
+            return False
+        self._slots[tail] = item
+        self._tail = next_tail
+        return True
+
+    def pop(self):
+        head = self._head
+        if head == self._tail:
+            return None
+        item = self._slots[head]
+        self._slots[head] = None
+        self._head = (head + 1) % len(self._slots)
+        return item
+
+
+class BufferedAudioSource(discord.AudioSource):
+    # A reader szal egyszerre egy modban (PCM vagy Opus) dekodol. Mod valtaskor a ringben levo keretek
+    # megmaradnak, a dekoder pedig a ring vegenek poziciojatol folytatja; a kulonbozo modu kereteket
+    # a fogyaszto atadja (Opus -> PCM dekodolva), igy a valtas alatt sincs csend.
+    def __init__(
+        self,
+        source: discord.AudioSource,
+        *,
+        capacity_frames: int,
+        max_capacity_frames: Optional[int] = None,
+        start_opus: bool = False,
+    ):
+        self.source = source
+        self.underruns = 0
+        self.underrun_events = 0
+        self.played_frames = 0
+        self.target_frames = max(1, capacity_frames)
+        self.max_capacity_frames = max(self.target_frames, max_capacity_frames or self.target_frames)
+        self._ring = FrameRingBuffer(self.max_capacity_frames)
+        self._rebuffering = False
+        self._recent_underrun_times: list[float] = []
+        # Fogyaszto oldali keres es a reader altal tenylegesen gyartott mod.
+        self._requested_opus = bool(start_opus) and self.opus_passthrough
+        self._reader_opus = self._requested_opus
+        self._opus_decoder = None
+        self._eof = False
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._reader_loop,
+            name=f"audio-reader-{type(source).__name__}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    @property
+    def opus_passthrough(self) -> bool:
+        return bool(getattr(self.source, "opus_passthrough", False))
+
+    @property
+    def buffered_frames(self) -> int:
+        return len(self._ring)
+
+    @property
+    def buffered_seconds(self) -> float:
+        return self.buffered_frames / FRAMES_PER_SECOND
+
+    @property
+    def fill_level(self) -> float:
+        return min(1.0, self.buffered_frames / self.target_frames)
+
+    @property
+    def reached_eof(self) -> bool:
+        return self._eof
+
+    @property
+    def switching(self) -> bool:
+        return self._requested_opus != self._reader_opus and not self._eof
+
+    def request_mode(self, opus: bool) -> None:
+        # Elore jelzi, melyik modban fogjak olvasni (pl. pre-roll alatt); keretet nem dob el.
+        self._requested_opus = bool(opus) and self.opus_passthrough
+
+    def _register_underrun(self) -> None:
+        self.underrun_events += 1
+        now = time.monotonic()
+        self._recent_underrun_times = [
+            started_at
+            for started_at in self._recent_underrun_times
+            if now - started_at <= UNDERRUN_GROWTH_WINDOW_SECONDS
+        ]
+        self._recent_underrun_times.append(now)
+        if (
+            len(self._recent_underrun_times) >= UNDERRUN_GROWTH_EVENTS
+            and self.target_frames < self.max_capacity_frames
+        ):
+            previous_target = self.target_frames
+            self.target_frames = min(
+                self.max_capacity_frames,
+                int(self.target_frames * UNDERRUN_GROWTH_FACTOR) + 1,
+            )
+            self._recent_underrun_times.clear()
+            logger.info(
+                "Read-ahead buffer grown after repeated underruns. source=%s frames=%s->%s",
+                type(self.source).__name__,
+                previous_target,
+                self.target_frames,
+            )
+
+    def _reader_loop(self) -> None:
+        while not self._closed:
+            # A forras a sajat poziciojarol (= a ringbe mar betett keretek utan) indul uj modban.
+            read_opus = self._requested_opus
+            try:
+                data = self.source.read_opus() if read_opus else self.source.read()
+            except Exception as e:
+                if not self._closed:
+                    logger.warning("Buffered audio reader failed (%s): %s", type(self.source).__name__, e)
+                data = b""
+
+            if not data:
+                self._eof = True
+                return
+
+            while not self._closed:
+                if len(self._ring) < self.target_frames and self._ring.push((read_opus, data)):
+                    break
+                time.sleep(READER_FULL_SLEEP_SECONDS)
+            self._reader_opus = read_opus
+
+    def _decode_opus(self, packet: bytes) -> bytes:
+        # Opus -> PCM atadas: a valtas elotti, meg Opus modban pufferelt keretek is lejatszhatok maradnak.
+        decoder = self._opus_decoder
+        if decoder is None:
+            try:
+                decoder = self._opus_decoder = discord.opus.Decoder()
+            except Exception as e:
+                logger.warning("Opus decoder unavailable for buffered hand-over: %s", e)
+                return PCM_SILENCE
+        try:
+            pcm = decoder.decode(packet, fec=False)
+        except Exception as e:
+            logger.debug("Opus hand-over decode failed: %s", e)
+            return PCM_SILENCE
+        if len(pcm) < FRAME_SIZE:
+            return pcm + PCM_SILENCE[len(pcm):]
+        return pcm[:FRAME_SIZE]
+
+    def read_preferred(self, opus: bool) -> tuple[bytes, bool]:
+        # (keret, Opus-e); Opus kereskor a meg PCM modban pufferelt keretek PCM-kent jonnek vissza.
+        self._requested_opus = bool(opus) and self.opus_passthrough
+
+        if self._rebuffering:
+            # Jitter buffer: akadas utan csak akkor indulunk ujra, ha a buffer fele megtelt.
+            if len(self._ring) < max(1, self.target_frames // 2) and not self._eof:
+                self.underruns += 1
+                return (OPUS_SILENCE, True) if opus else (PCM_SILENCE, False)
+            self._rebuffering = False
+
+        item = self._ring.pop()
+        if item is None:
+            if self._eof:
+                return b"", opus
+            # A tervezett mod valtas alatti ures ring nem akadas.
+            if self.played_frames and not self.switching:
+                self.underruns += 1
+                self._rebuffering = True
+                self._register_underrun()
+            return (OPUS_SILENCE, True) if opus else (PCM_SILENCE, False)
+
+        item_opus, data = item
+        self.played_frames += 1
+        if item_opus and not opus:
+            return self._decode_opus(data), False
+        self._opus_decoder = None
+        return data, item_opus
+
+    def read(self) -> bytes:
+        return self.read_preferred(False)[0]
+
+    def cleanup(self) -> None:
+        self._closed = True
+        cleanup = getattr(self.source, "cleanup", None)
+        if callable(cleanup):
+            cleanup()
+
+    def is_opus(self):
+        return False
@@ -199,6 +199,13 @@ async def before_daily_quote_task():
     )
 
 
+@tasks.loop(seconds=TRACK_CACHE_FLUSH_INTERVAL_SECONDS)
+async def track_cache_flush_task():
+    # A cache talalatok csak a memoriaban frissitik az indexet; itt irjuk ki oket.
+    if track_cache:
+        await asyncio.to_thread(track_cache.flush)
+
+
 # --- BELSŐ API ---
 
 
@@ -362,9 +369,7 @@ async def prank_loop():
 
             await settle_voice_connection(connection_changed)
             mixer = get_mixer(voice_client)
-            mixer.add_sfx(build_sfx_source(file_path))
-            while mixer.has_sfx():
-                await asyncio.sleep(1)
+            await mixer.add_sfx(build_sfx_source(file_path))
             prank_played = True
             logger.info(
                 "Auto prank playback finished. file=%s guild=%s(%s)",
@@ -415,6 +420,22 @@ async def prank_loop():
             )
 
 
+async def _refresh_sound_bank() -> None:
+    try:
+        stats = await refresh_sound_bank()
+    except Exception:
+        logger.exception("Sound bank refresh failed.")
+        return
+    logger.info(
+        "Sound bank refresh finished. reused=%s decoded=%s removed=%s failed=%s written=%s",
+        stats["reused"],
+        stats["decoded"],
+        stats["removed"],
+        stats["failed"],
+        stats["written"],
+    )
+
+
 @bot.event
 async def on_ready():
     from bot_app.mqtt_handler import start_mqtt
@@ -442,6 +463,22 @@ async def on_ready():
         bot.loop.create_task(prank_loop())
         bot.prank_task_started = True
         logger.info("Prank loop task started.")
+    if not getattr(bot, "sound_bank_refresh_started", False):
+        bot.loop.create_task(_refresh_sound_bank())
+        bot.sound_bank_refresh_started = True
+        logger.info("Sound bank refresh started. file=%s", SOUND_BANK_FILE)
+    if not getattr(bot, "sfx_cache_warmup_started", False):
+        warm_sfx_cache()
+        bot.sfx_cache_warmup_started = True
+        logger.info("SFX cache warmup queued. folders=%s", ", ".join(SFX_CACHE_FOLDERS))
+    if not getattr(bot, "loudness_scan_started", False):
+        scan_sfx_loudness()
+        bot.loudness_scan_started = True
+        logger.info("Loudness analysis queued. index=%s target=%s LUFS", LOUDNESS_INDEX_FILE, LOUDNESS_TARGET_LUFS)
+    if not getattr(bot, "music_cache_scan_started", False):
+        music_cache.scan(MUSIC_DIR)
+        bot.music_cache_scan_started = True
+        logger.info("Music cache scan queued. cache_dir=%s", MUSIC_CACHE_DIR)
     if not getattr(bot, "internal_server_started", False):
         bot.loop.create_task(start_internal_server())
         bot.internal_server_started = True
@@ -450,6 +487,10 @@ async def on_ready():
         daily_quote_task.start()
         bot.daily_quote_task_started = True
         logger.info("Daily quote task started.")
+    if track_cache and not getattr(bot, "track_cache_flush_task_started", False):
+        track_cache_flush_task.start()
+        bot.track_cache_flush_task_started = True
+        logger.info("Track cache flush task started. interval=%ss", TRACK_CACHE_FLUSH_INTERVAL_SECONDS)
     if not getattr(bot, "scheduled_messages_loaded", False):
         async with scheduled_messages_lock:
             scheduled_messages.clear()
@@ -1,3 +1,5 @@
+import itertools
+
 from bot_app.core import *
 from bot_app.alerts import stop_radnai_alert
 from bot_app.automation import send_daily_quote
@@ -11,10 +13,13 @@ from bot_app.factorio_control import (
     list_factorio_access_entries,
     remove_factorio_access_member,
 )
+
 import bot_app.core as core
 
 
 FACTORIO_LIST_ADMIN_USER_ID = 284011534198374411
+QUEUE_PAGE_SIZE = 15
+QUEUE_TITLE_MAX_CHARS = 80
 
 
 def _voice_channel_name(channel: Optional[discord.VoiceChannel]) -> str:
@@ -130,7 +135,10 @@ async def help_command(ctx):
             "**!play <url/cím>**: Lejátszás YouTube-ról, Spotify-ról vagy helyi fájlból.\n"
             "**!skip**: Jelenlegi zene átugrása.\n"
             "**!pause** / **!resume**: Szünet / Folytatás.\n"
-            "**!queue**: Lejátszási lista megtekintése.\n"
+            "**!queue [oldal]**: Lejátszási lista megtekintése.\n"
+            "**!shuffle**: A lista megkeverése.\n"
+            "**!move <honnan> <hova>**: Egy szám áthelyezése a listában.\n"
+            "**!remove <sorszám>**: Egy szám törlése a listából.\n"
             "**!sajat-zenek**: A 'music' mappában lévő fájlok listázása.\n"
             "**!join** / **!leave**: Belépés és kilépés.\n"
             "**!lábhoz**: Minden folyamat leállítása és leválasztás."
@@ -155,7 +163,9 @@ async def help_command(ctx):
             "**!Vegyes mód**: Jimmy és sima hangok vegyesen.\n"
             "**!Random-bejátszás <on/off>**: Az automata bejátszás ki/bekapcsolása.\n"
             "**!Jimmyteszt**: Egy random Jimmy hang azonnali bejátszása.\n"
-            "**!mondas_teszt**: A nap mondása tesztelése (azonnali küldés)."
+            "**!mondas_teszt**: A nap mondása tesztelése (azonnali küldés).\n"
+            "**!hangbank**: Az előre dekódolt hangbank frissítése.\n"
+            "**!mixerstat**: A hangkeverő időzítési és akadás statisztikái."
         ),
         inline=False,
     )
@@ -348,10 +358,7 @@ async def mondd(ctx, *, text: str):
         tts.save(tts_file)
 
         mixer = get_mixer(voice_client)
-        mixer.set_main_source(discord.FFmpegPCMAudio(tts_file, options="-vn"))
-
-        while mixer.has_main_source():
-            await asyncio.sleep(0.2)
+        await mixer.set_main_source(build_tts_source(tts_file))
     finally:
         if os.path.exists(tts_file):
             os.remove(tts_file)
@@ -403,27 +410,21 @@ async def play(ctx, *, url):
 
     async with play_lock:
         async with ctx.typing():
-            player = None
+            queued_track = None
 
             if not url.startswith("http"):
                 local_filename = find_local_music(url)
                 if local_filename:
-                    file_path = os.path.join("music", local_filename)
-                    source = discord.FFmpegPCMAudio(file_path, options="-vn")
-                    player = LocalFileSource(source, title=local_filename)
+                    queued_track = LocalTrack(local_filename)
                     await ctx.send(f"Helyi zene megtalalva: **{local_filename}**")
 
-            if player is None:
+            if queued_track is None:
                 search_query = url
                 if "spotify.com" in url and "track" in url:
                     try:
-                        track = sp.track(url)
-                        artist_name = track["artists"][0]["name"]
-                        track_name = track["name"]
-                        search_query = f"ytsearch:{artist_name} - {track_name}"
-                        await ctx.send(
-                            f"Spotify: **{artist_name} - {track_name}** keresese..."
-                        )
+                        spotify_query = await spotify_resolver.resolve(url)
+                        search_query = f"ytsearch:{spotify_query}"
+                        await ctx.send(f"Spotify: **{spotify_query}** keresese...")
                     except Exception:
                         logger.exception(
                             "Spotify metadata lookup failed in play. guild=%s user=%s url=%s",
@@ -436,54 +437,15 @@ async def play(ctx, *, url):
                 elif not url.startswith("http"):
                     search_query = f"ytsearch:{url}"
 
-                candidate_queries = [search_query]
-                if search_query.startswith("ytsearch:"):
-                    expanded_query = search_query.replace("ytsearch:", "ytsearch5:", 1)
-                    try:
-                        search_data = await asyncio.wait_for(
-                            bot.loop.run_in_executor(
-                                None, lambda: ytdl.extract_info(expanded_query, download=False)
-                            ),
-                            timeout=25,
-                        )
-                        entries = search_data.get("entries") if isinstance(search_data, dict) else None
-                        extracted_candidates = []
-                        for entry in entries or []:
-                            if not entry:
-                                continue
-                            candidate = entry.get("webpage_url") or entry.get("url")
-                            if candidate and candidate not in extracted_candidates:
-                                extracted_candidates.append(candidate)
-                        if extracted_candidates:
-                            candidate_queries = extracted_candidates[:5]
-                    except Exception as e:
-                        logger.warning(
-                            "Search expansion failed for '%s': %s", expanded_query, e
-                        )
+                candidate_queries = await search_track_candidates(search_query, guild_id=ctx.guild.id)
 
-                download_errors = []
-                for candidate in candidate_queries:
-                    try:
-                        player = await YTDLSource.from_url(candidate, loop=bot.loop, stream=False)
-                        break
-                    except Exception as e:
-                        download_errors.append(e)
-                        logger.warning("Download mode failed for '%s': %s", candidate, e)
-
-                if player is None:
-                    for candidate in candidate_queries:
-                        try:
-                            player = await YTDLSource.from_url(candidate, loop=bot.loop, stream=True)
-                            await ctx.send("A letoltes nem sikerult, stream modra valtottam.")
-                            break
-                        except Exception as stream_error:
-                            logger.warning(
-                                "Stream fallback failed for '%s': %s",
-                                candidate,
-                                stream_error,
-                            )
-
-                if player is None:
+                queued_track, streamed, download_errors = await race_playable_tracks(
+                    candidate_queries, guild_id=ctx.guild.id
+                )
+                if queued_track is not None and streamed:
+                    await ctx.send("A letoltes lassu vagy sikertelen volt, stream modra valtottam.")
+
+                if queued_track is None:
                     base_error = download_errors[-1] if download_errors else "Nincs lejatszhato forras."
                     short_error = str(base_error).replace("\n", " ").strip()
                     if len(short_error) > 220:
@@ -496,7 +458,7 @@ async def play(ctx, *, url):
                     ctx, target_channel, settle=True
                 )
             except Exception as e:
-                cleanup_audio_source(player)
+                queued_track.release()
                 logger.exception(
                     "Re-ensure voice client failed in play. guild=%s target=%s user=%s",
                     guild_id,
@@ -507,14 +469,14 @@ async def play(ctx, *, url):
                 return
 
             if not voice_channel:
-                cleanup_audio_source(player)
+                queued_track.release()
                 await ctx.send("Elveszett a hangkapcsolat, probald ujra a !play parancsot.")
                 return
 
             try:
                 mixer = get_mixer(voice_channel)
             except Exception as e:
-                cleanup_audio_source(player)
+                queued_track.release()
                 logger.exception(
                     "Failed to initialize mixer in play. guild=%s channel=%s user=%s",
                     guild_id,
@@ -523,20 +485,27 @@ async def play(ctx, *, url):
                 )
                 await ctx.send(f"Nem sikerult elinditani a lejatszot: {e}")
                 return
-            if mixer.main_source or voice_channel.is_paused():
-                song_queues[guild_id].append(player)
-                titles_queues[guild_id].append(player.title)
+            if mixer.main_source or is_user_paused(voice_channel):
+                # A sor csak a konnyu bejegyzest tarolja, az ffmpeg majd a pre-roll ablakban indul.
+                try:
+                    queue_length = ensure_queue(guild_id).append(queued_track)
+                except (TrackQueueFull, DuplicateTrack) as e:
+                    queued_track.release()
+                    await ctx.send(str(e))
+                    return
+                stage_next_in_queue(guild_id, mixer)
                 logger.info(
                     "Track queued. guild=%s title=%s queue_length=%s",
                     guild_id,
-                    player.title,
-                    len(titles_queues[guild_id]),
+                    queued_track.title,
+                    queue_length,
                 )
-                await ctx.send(f"Sorba allitva: **{player.title}**")
+                await ctx.send(f"Sorba allitva: **{queued_track.title}** (#{queue_length})")
             else:
-                mixer.set_main_source(player, on_end=lambda: play_next_in_queue(ctx))
-                logger.info("Track started. guild=%s title=%s", guild_id, player.title)
-                await ctx.send(f"Most szol: **{player.title}**")
+                mixer.set_main_source(queued_track.build_source(), on_end=lambda: play_next_in_queue(ctx))
+                queued_track.release()
+                logger.info("Track started. guild=%s title=%s", guild_id, queued_track.title)
+                await ctx.send(f"Most szol: **{queued_track.title}**")
 
 
 @bot.command(name="rulett")
@@ -781,7 +750,8 @@ async def skip(ctx):
     voice_client = ctx.voice_client
     if voice_client and (voice_client.is_playing() or voice_client.is_paused()):
         mixer = get_mixer(voice_client)
-        mixer.set_main_source(None)
+        # Az elore betoltott kovetkezo szamra valtunk, nem epitjuk ujra hidegen.
+        mixer.skip_to_next()
         await play_next_in_queue(ctx)
         await ctx.send("⏭️ Zene átugorva!")
 
@@ -795,21 +765,105 @@ async def pause(ctx):
 
 @bot.command(name="resume")
 async def resume(ctx):
-    if ctx.voice_client and ctx.voice_client.is_paused():
+    if is_user_paused(ctx.voice_client):
         ctx.voice_client.resume()
         await ctx.send("▶️ Zene folytatása.")
 
 
+def format_track_duration(seconds: Optional[float]) -> str:
+    if not seconds:
+        return "?"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def format_queue_page(track_queue: GuildTrackQueue, page: int) -> str:
+    # Oldalanként QUEUE_PAGE_SIZE sor, levagott cimekkel, hogy az uzenet 2000 karakter alatt maradjon.
+    page_count = max(1, -(-len(track_queue) // QUEUE_PAGE_SIZE))
+    page = min(max(1, page), page_count)
+    start = (page - 1) * QUEUE_PAGE_SIZE
+    lines = [f"**Lejátszási lista** ({len(track_queue)} szám, {page}. / {page_count} oldal):"]
+    page_tracks = itertools.islice(track_queue, start, start + QUEUE_PAGE_SIZE)
+    for position, track in enumerate(page_tracks, start=start + 1):
+        title = track.title
+        if len(title) > QUEUE_TITLE_MAX_CHARS:
+            title = title[:QUEUE_TITLE_MAX_CHARS].rstrip() + "…"
+        lines.append(f"{position}. {title} `{format_track_duration(getattr(track, 'duration', None))}`")
+    if page < page_count:
+        lines.append(f"*Következő oldal: !queue {page + 1}*")
+    return "\n".join(lines)
+
+
+def restage_queue(guild_id: int) -> None:
+    mixer = mixers.get(guild_id)
+    if mixer:
+        stage_next_in_queue(guild_id, mixer)
+
+
 @bot.command(name="queue")
-async def queue(ctx):
-    guild_id = ctx.guild.id
-    if guild_id in titles_queues and len(titles_queues[guild_id]) > 0:
-        list_str = "\n".join(
-            [f"{i + 1}. {title}" for i, title in enumerate(titles_queues[guild_id])]
-        )
-        await ctx.send(f"**Lejátszási lista:**\n{list_str}")
-    else:
+async def queue(ctx, page: int = 1):
+    track_queue = song_queues.get(ctx.guild.id)
+    if not track_queue:
+        await ctx.send("A lista jelenleg üres.")
+        return
+    await ctx.send(format_queue_page(track_queue, page))
+
+
+@bot.command(name="shuffle")
+async def shuffle(ctx):
+    track_queue = song_queues.get(ctx.guild.id)
+    if not track_queue or len(track_queue) < 2:
+        await ctx.send("Nincs mit megkeverni a listában.")
+        return
+    track_queue.shuffle()
+    restage_queue(ctx.guild.id)
+    await ctx.send(f"🔀 Lista megkeverve ({len(track_queue)} szám).")
+
+
+@bot.command(name="move")
+async def move(ctx, from_position: int, to_position: int):
+    track_queue = song_queues.get(ctx.guild.id)
+    if not track_queue:
+        await ctx.send("A lista jelenleg üres.")
+        return
+    try:
+        track = track_queue.move(from_position, to_position)
+    except IndexError as e:
+        await ctx.send(str(e))
+        return
+    restage_queue(ctx.guild.id)
+    await ctx.send(f"↕️ **{track.title}** áthelyezve: {from_position}. → {to_position}.")
+
+
+@move.error
+async def move_error(ctx, error):
+    if isinstance(error, (commands.MissingRequiredArgument, commands.BadArgument)):
+        await ctx.send("Használat: !move <honnan> <hova>")
+
+
+@bot.command(name="remove")
+async def remove(ctx, position: int):
+    track_queue = song_queues.get(ctx.guild.id)
+    if not track_queue:
         await ctx.send("A lista jelenleg üres.")
+        return
+    try:
+        track = track_queue.remove(position)
+    except IndexError as e:
+        await ctx.send(str(e))
+        return
+    restage_queue(ctx.guild.id)
+    track.release()
+    await ctx.send(f"🗑️ Eltávolítva a listából: **{track.title}**")
+
+
+@remove.error
+async def remove_error(ctx, error):
+    if isinstance(error, (commands.MissingRequiredArgument, commands.BadArgument)):
+        await ctx.send("Használat: !remove <sorszám>")
 
 
 @bot.command(name="leave")
@@ -907,7 +961,7 @@ async def titkosteszt(ctx):
         await ctx.send("❌ Előbb lépj be egy csatornára öreg")
         return
 
-    sound_files = get_audio_files("sounds")
+    sound_files = get_prank_files("sounds")
     if not sound_files:
         await ctx.send("❌ Hiba: Nincs 'sounds' mappa vagy üres!")
         return
@@ -924,10 +978,7 @@ async def titkosteszt(ctx):
         created = not had_voice_client
 
         mixer = get_mixer(voice_client)
-        mixer.add_sfx(build_sfx_source(file_path))
-
-        while mixer.has_sfx():
-            await asyncio.sleep(1)
+        await mixer.add_sfx(build_sfx_source(file_path))
 
         if created and not mixer.main_source:
             lock = get_voice_operation_lock(ctx.guild.id)
@@ -951,6 +1002,138 @@ async def titkosteszt_error(ctx, error):
         await ctx.send("Ehhez a parancshoz admin jogosultság kell!")
 
 
+@bot.command(name="hangbank")
+@commands.has_permissions(administrator=True)
+async def hangbank(ctx):
+    if sound_bank_rebuild_lock.locked():
+        await ctx.send("⏳ Már fut egy hangbank frissítés, megvárom.")
+    else:
+        await ctx.send("🔄 Hangbank frissítése folyamatban...")
+    try:
+        stats = await refresh_sound_bank()
+    except Exception as e:
+        logger.exception(
+            "Sound bank rebuild failed. guild=%s user=%s",
+            ctx.guild.id if ctx.guild else "dm",
+            ctx.author.id if ctx.author else "unknown",
+        )
+        await ctx.send(f"❌ Nem sikerült frissíteni a hangbankot: {e}")
+        return
+
+    await ctx.send(
+        "✅ Hangbank kész. "
+        f"Újrahasznosítva: {stats['reused']}, dekódolva: {stats['decoded']}, "
+        f"törölve: {stats['removed']}, hibás: {stats['failed']}."
+    )
+
+
+@hangbank.error
+async def hangbank_error(ctx, error):
+    if isinstance(error, commands.MissingPermissions):
+        await ctx.send("Ehhez a parancshoz admin jogosultság kell!")
+
+
+def format_mixer_stats(
+    stats: dict,
+    ffmpeg_stats: dict,
+    track_cache_stats: Optional[dict] = None,
+    ytdl_stats: Optional[dict] = None,
+) -> str:
+    read_time = stats["read_time"]
+    lines = [
+        "**🎛️ Mixer statisztika:**",
+        f"Most szól: `{stats.get('main_title') or '-'}`",
+        (
+            f"Következő: `{stats.get('next_title') or '-'}`"
+            + (" (előtöltve)" if stats.get("next_prerolled") else "")
+        ),
+        (
+            f"Frame-ek: {stats['frames']} | csend: {stats['silence_frames']} | "
+            f"Opus passthrough: {stats['opus_passthrough_frames']} | akadás: {stats['underruns']}"
+        ),
+        (
+            f"Overlay most / max: {stats['active_overlays']} / {stats['max_overlays']} | "
+            f"zene ducking: {int(stats['duck_gain'] * 100)}%"
+        ),
+        f"read() átlag / max: {read_time['avg_ms']} ms / {read_time['max_ms']} ms",
+        (
+            f"Üresjárati felfüggesztés: {'igen' if stats['idle_suspended'] else 'nem'} "
+            f"({stats['idle_suspensions']}×)"
+        ),
+        (
+            f"Limiter: most -{stats['limiter']['gain_reduction_db']} dB, "
+            f"max -{stats['limiter']['max_gain_reduction_db']} dB, "
+            f"limitált frame: {stats['limiter']['limited_frames']}"
+            if stats.get("limiter")
+            else "Limiter: kikapcsolva"
+        ),
+        "Hisztogram: "
+        + ", ".join(
+            f"{bucket}={count}"
+            for bucket, count in stats["read_time_histogram"].items()
+            if count
+        ),
+    ]
+    for name, timing in stats["sources"].items():
+        lines.append(
+            f"- `{name}`: {timing['frames']} frame, átlag {timing['avg_ms']} ms, max {timing['max_ms']} ms"
+        )
+    for frame_buffer in stats["buffers"]:
+        lines.append(
+            f"- buffer `{frame_buffer['source']}`: {frame_buffer['buffered_seconds']} s "
+            f"({int(frame_buffer['fill_level'] * 100)}%), akadás: {frame_buffer['underruns']}"
+        )
+    lines.append(
+        f"ffmpeg folyamatok: {ffmpeg_stats['live']} / {ffmpeg_stats['max_processes']} "
+        f"(várakozik: {ffmpeg_stats['waiting']}, csúcs: {ffmpeg_stats['peak_live']}, "
+        f"elutasítva: {ffmpeg_stats['rejected']})"
+    )
+    for process in ffmpeg_stats["processes"]:
+        lines.append(
+            f"- ffmpeg `{process['label']}` [{process['priority']}] pid={process['pid'] or '-'}, "
+            f"{process['age_seconds']} s"
+        )
+    if track_cache_stats:
+        lines.append(
+            f"Zene cache: {track_cache_stats['entries']} szám, "
+            f"{track_cache_stats['bytes'] // (1024 * 1024)} / {track_cache_stats['max_bytes'] // (1024 * 1024)} MB | "
+            f"találat: {track_cache_stats['hits']}, hiány: {track_cache_stats['misses']} "
+            f"({int(track_cache_stats['hit_rate'] * 100)}%), kiürítve: {track_cache_stats['evictions']}"
+        )
+    if ytdl_stats:
+        lines.append(
+            f"yt-dlp workerek: {ytdl_stats['busy']} / {ytdl_stats['max_workers']} foglalt | "
+            f"sorban: {ytdl_stats['queue_depth']} (csúcs: {ytdl_stats['peak_queue_depth']}) | "
+            f"háttér letöltés: {ytdl_stats['background_busy']} fut, {ytdl_stats['background_queue_depth']} vár | "
+            f"kész: {ytdl_stats['completed']}, hiba: {ytdl_stats['failed']}, leállítva: {ytdl_stats['killed']}"
+        )
+    return "\n".join(lines)
+
+
+@bot.command(name="mixerstat")
+@commands.has_permissions(administrator=True)
+async def mixerstat(ctx):
+    mixer = mixers.get(ctx.guild.id)
+    if mixer is None:
+        await ctx.send("Nincs aktív hangkeverő ezen a szerveren.")
+        return
+    await send_long_message(
+        ctx,
+        format_mixer_stats(
+            mixer.stats_snapshot(),
+            ffmpeg_budget.snapshot(),
+            track_cache.stats() if track_cache else None,
+            ytdl_pool.snapshot(),
+        ),
+    )
+
+
+@mixerstat.error
+async def mixerstat_error(ctx, error):
+    if isinstance(error, commands.MissingPermissions):
+        await ctx.send("Ehhez a parancshoz admin jogosultság kell!")
+
+
 @bot.command(name="mondas_teszt")
 @commands.has_permissions(administrator=True)
 async def mondas_teszt(ctx):
@@ -970,7 +1153,7 @@ async def jimmyteszt(ctx):
         await ctx.send("❌ Előbb lépj be egy csatornára öreg")
         return
 
-    jimmy_files = get_audio_files("jimmy")
+    jimmy_files = get_prank_files("jimmy")
     if not jimmy_files:
         await ctx.send("❌ Hiba: Nincs 'jimmy' mappa vagy üres!")
         return
@@ -987,10 +1170,7 @@ async def jimmyteszt(ctx):
         created = not had_voice_client
 
         mixer = get_mixer(voice_client)
-        mixer.add_sfx(build_sfx_source(file_path))
-
-        while mixer.has_sfx():
-            await asyncio.sleep(1)
+        await mixer.add_sfx(build_sfx_source(file_path))
 
         if created and not mixer.main_source:
             lock = get_voice_operation_lock(ctx.guild.id)
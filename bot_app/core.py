@@ -1,13 +1,14 @@
 import asyncio
-import audioop
 import calendar
 import datetime
+import functools
 import json
 import os
 import random
 import re
 import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Callable, Optional
 from uuid import uuid4
 
@@ -19,14 +20,39 @@ from discord.ext import commands, tasks
 from dotenv import load_dotenv
 from gtts import gTTS
 from spotipy.oauth2 import SpotifyClientCredentials
+from bot_app.audio_buffer import FRAMES_PER_SECOND, BufferedAudioSource, seconds_to_frames
+from bot_app.ffmpeg_budget import FFmpegPriority, ffmpeg_budget
 from bot_app.logging_setup import get_logger, setup_logging
+from bot_app.loudness import LoudnessIndex
+from bot_app.metadata_cache import METADATA_CACHED_FIELD, YTDLMetadataCache, info_subset
+from bot_app.mixer_metrics import MixerMetrics
+from bot_app.mixing import (
+    FRAME_DURATION_MS,
+    FRAME_SIZE,
+    DuckingEnvelope,
+    LookaheadLimiter,
+    PCMFrameMixer,
+)
+from bot_app.music_cache import OpusLibraryCache
+from bot_app.sfx_cache import MemoryPCMAudio, SfxPCMCache, pcm_bytes_for_seconds
+from bot_app.sound_bank import SOUND_BANK_FOLDERS, SoundBank, build_sound_bank
+from bot_app.spotify_resolver import SpotifyResolver
+from bot_app.track_cache import (
+    TRACK_CACHE_FLUSH_INTERVAL_SECONDS,
+    TrackCache,
+    track_cache_key,
+    track_cache_key_from_info,
+)
+from bot_app.track_info import TrackInfo
+from bot_app.track_queue import DuplicateTrack, GuildTrackQueue, TrackQueueFull
+from bot_app.ytdl_pool import YTDLProcessPool
 
 # --- BEÁLLÍTÁSOK ---
 MIN_TIME = 1800  # Minimum 30 percet hagyjunk a napi prankek kozott, ha a nap hossza engedi
 DAILY_PRANK_TARGET_COUNT = 2
 VOICE_CONNECTION_SETTLE_SECONDS = 0.75
 SFX_LEAD_IN_MS = 350
-PCM_SILENCE_FRAME = b"\x00" * 3840
+PCM_SILENCE_FRAME = b"\x00" * FRAME_SIZE
 # -------------------
 INTERNAL_API_PORT = 5050  # Port az internal API-hoz (Docker konténeren belül)
 TARGET_CHANNEL_ID: Optional[int] = 1370685414578327594
@@ -36,7 +62,15 @@ RADNAI_CHAT_ALERT_REPEAT_COUNT = 5
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PRANK_STATE_FILE = os.path.join(BASE_DIR, "prank_state.json")
 SCHEDULED_MESSAGES_FILE = os.path.join(BASE_DIR, "scheduled_messages.json")
+SOUND_BANK_FILE = os.path.join(BASE_DIR, "sound_bank.bin")
+MUSIC_DIR = "music"
+MUSIC_CACHE_DIR = os.getenv("MUSIC_CACHE_DIR") or os.path.join(BASE_DIR, "music_cache")
+TRACK_CACHE_DIR = os.getenv("TRACK_CACHE_DIR") or os.path.join(BASE_DIR, "track_cache")
 SCHEDULER_POLL_INTERVAL_SECONDS = 5
+ROULETTE_SOUNDS_DIR = "/app/roulette_sounds"
+RADNAI_ALERT_SOUNDS_DIR = "/app/radnai_alert"
+SFX_CACHE_FOLDERS = ("sounds", "jimmy", ROULETTE_SOUNDS_DIR, RADNAI_ALERT_SOUNDS_DIR)
+LOUDNESS_SFX_FOLDERS = ("sounds", "jimmy", RADNAI_ALERT_SOUNDS_DIR)
 
 # --- PRANK ÁLLAPOT ---
 prank_enabled = True
@@ -72,11 +106,62 @@ SPOTIPY_CLIENT_SECRET = os.getenv("SPOTIPY_CLIENT_SECRET")
 GATEWAY_RECOVERY_TIMEOUT_SECONDS = read_int_env(
     "DISCORD_GATEWAY_RECOVERY_TIMEOUT_SECONDS", 300, minimum=0
 )
+MUSIC_VOLUME_PERCENT = read_int_env("MUSIC_VOLUME_PERCENT", 50, minimum=0)
+MUSIC_DEFAULT_VOLUME = min(MUSIC_VOLUME_PERCENT, 200) / 100
+OPUS_PASSTHROUGH_ENABLED = bool(read_int_env("OPUS_PASSTHROUGH_ENABLED", 1, minimum=0))
+# Overlay utan ennyi csendes frame kell, mielott visszavaltunk Opus passthrough-ra.
+OPUS_PASSTHROUGH_RESUME_FRAMES = 50
+# Ennyi teljesen ures frame utan a mixer szunetelteti a lejatszot (nincs Opus kodolas, nincs UDP).
+MIXER_IDLE_SUSPEND_FRAMES = 50
+AUDIO_BUFFER_FRAMES = read_int_env("AUDIO_BUFFER_FRAMES", 50, minimum=2)
+STREAM_READAHEAD_SECONDS = read_int_env("STREAM_READAHEAD_SECONDS", 3, minimum=1)
+STREAM_READAHEAD_MAX_SECONDS = read_int_env(
+    "STREAM_READAHEAD_MAX_SECONDS", 15, minimum=STREAM_READAHEAD_SECONDS
+)
+# A sor kovetkezo szamanak dekodere ennyivel az aktualis szam vege elott indul.
+QUEUE_PREROLL_SECONDS = read_int_env("QUEUE_PREROLL_SECONDS", 5, minimum=1)
+CROSSFADE_MS = read_int_env("CROSSFADE_MS", 0, minimum=0)
+QUEUE_MAX_LENGTH = read_int_env("QUEUE_MAX_LENGTH", 100, minimum=1)
+# Overlay (SFX, riasztas) alatt a zene ennyi szazalekra halkul; 100 = nincs ducking.
+DUCK_DEPTH_PERCENT = min(read_int_env("DUCK_DEPTH_PERCENT", 35, minimum=0), 100)
+DUCK_ATTACK_MS = read_int_env("DUCK_ATTACK_MS", 30, minimum=0)
+DUCK_RELEASE_MS = read_int_env("DUCK_RELEASE_MS", 400, minimum=0)
+LIMITER_ENABLED = bool(read_int_env("LIMITER_ENABLED", 1, minimum=0))
+LIMITER_THRESHOLD_DB = min(read_int_env("LIMITER_THRESHOLD_DB", -1, minimum=-24), 0)
+LIMITER_LOOKAHEAD_MS = min(read_int_env("LIMITER_LOOKAHEAD_MS", 2, minimum=1), FRAME_DURATION_MS // 2)
+LIMITER_RELEASE_MS = read_int_env("LIMITER_RELEASE_MS", 80, minimum=1)
+SFX_CACHE_MAX_MB = read_int_env("SFX_CACHE_MAX_MB", 96, minimum=0)
+SFX_CACHE_MAX_CLIP_SECONDS = read_int_env("SFX_CACHE_MAX_CLIP_SECONDS", 45, minimum=1)
+LOUDNESS_NORMALIZATION_ENABLED = bool(read_int_env("LOUDNESS_NORMALIZATION_ENABLED", 1, minimum=0))
+LOUDNESS_TARGET_LUFS = read_int_env("LOUDNESS_TARGET_LUFS", -20, minimum=-70)
+LOUDNESS_INDEX_FILE = os.getenv("LOUDNESS_INDEX_FILE") or os.path.join(MUSIC_CACHE_DIR, "loudness.json")
+# A letoltott szamok lemezes cache-e; 0 = kikapcsolva, ilyenkor lejatszas utan toroljuk a fajlt.
+TRACK_CACHE_MAX_MB = read_int_env("TRACK_CACHE_MAX_MB", 2048, minimum=0)
+# yt-dlp kereses/metaadat cache; 0 bejegyzes = kikapcsolva.
+YTDL_METADATA_CACHE_FILE = os.getenv("YTDL_METADATA_CACHE_FILE") or os.path.join(TRACK_CACHE_DIR, "metadata.json")
+YTDL_METADATA_CACHE_MAX_ENTRIES = read_int_env("YTDL_METADATA_CACHE_MAX_ENTRIES", 2000, minimum=0)
+YTDL_SEARCH_CACHE_TTL_MINUTES = read_int_env("YTDL_SEARCH_CACHE_TTL_MINUTES", 360, minimum=1)
+YTDL_INFO_CACHE_TTL_HOURS = read_int_env("YTDL_INFO_CACHE_TTL_HOURS", 168, minimum=1)
+# A kinyert stream URL ennyi ideig (de legfeljebb a sajat lejarataig) ujrahasznalhato; 0 = soha.
+YTDL_STREAM_URL_CACHE_TTL_MINUTES = read_int_env("YTDL_STREAM_URL_CACHE_TTL_MINUTES", 180, minimum=0)
+# Spotify szam -> "eloado - cim" cache; 0 bejegyzes = nincs lemezes cache, a feloldas akkor is a loopon kivul fut.
+SPOTIFY_CACHE_FILE = os.getenv("SPOTIFY_CACHE_FILE") or os.path.join(TRACK_CACHE_DIR, "spotify.json")
+SPOTIFY_CACHE_MAX_ENTRIES = read_int_env("SPOTIFY_CACHE_MAX_ENTRIES", 2000, minimum=0)
+SPOTIFY_CACHE_TTL_HOURS = read_int_env("SPOTIFY_CACHE_TTL_HOURS", 720, minimum=1)
+SPOTIFY_TIMEOUT_SECONDS = 10
 
 sp = spotipy.Spotify(
     auth_manager=SpotifyClientCredentials(
         client_id=SPOTIPY_CLIENT_ID, client_secret=SPOTIPY_CLIENT_SECRET
-    )
+    ),
+    requests_timeout=SPOTIFY_TIMEOUT_SECONDS,
+)
+spotify_resolver = SpotifyResolver(
+    sp,
+    SPOTIFY_CACHE_FILE if SPOTIFY_CACHE_MAX_ENTRIES else None,
+    ttl_seconds=SPOTIFY_CACHE_TTL_HOURS * 3600,
+    max_entries=SPOTIFY_CACHE_MAX_ENTRIES,
+    timeout_seconds=SPOTIFY_TIMEOUT_SECONDS,
 )
 
 intents = discord.Intents.default()
@@ -84,14 +169,14 @@ intents.message_content = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 bot.remove_command("help")
 
-song_queues = {}
-titles_queues = {}
+song_queues: dict[int, GuildTrackQueue] = {}
 play_locks = {}
 voice_operation_locks = {}
 afktasks = {}
 mixers = {}
 roulette_games = {}
 radnai_alert_lock = asyncio.Lock()
+sound_bank_rebuild_lock = asyncio.Lock()
 radnai_alert_stop_event: Optional[asyncio.Event] = None
 scheduled_messages_lock = asyncio.Lock()
 scheduled_messages: list[dict] = []
@@ -117,9 +202,59 @@ ytdl_format_options = {
     "cachedir": False,
 }
 YTDL_FETCH_TIMEOUT_SECONDS = 70
+YTDL_SEARCH_TIMEOUT_SECONDS = 25
+YTDL_SEARCH_CANDIDATES = 5
+# Egyszerre ennyi jeloltet probalunk letolteni; a stream valtozat ennyi mp utan indul parhuzamosan.
+PLAY_RACE_FANOUT = read_int_env("PLAY_RACE_FANOUT", 3, minimum=1)
+PLAY_STREAM_HEDGE_SECONDS = read_int_env("PLAY_STREAM_HEDGE_SECONDS", 6, minimum=0)
+# Ha egy hatrebb rangsorolt talalat keszul el elobb, ennyi mp-ig varunk a jobb helyezesuekre.
+PLAY_RACE_RANK_GRACE_SECONDS = read_int_env("PLAY_RACE_RANK_GRACE_SECONDS", 3, minimum=0)
+# Cache-hianynal a lejatszas a streambol indul, mikozben a fajl a hatterben a track cache-be toltodik.
+HYBRID_PLAYBACK_ENABLED = bool(read_int_env("HYBRID_PLAYBACK_ENABLED", 1, minimum=0))
+HYBRID_SWITCH_WAIT_SECONDS = read_int_env("HYBRID_SWITCH_WAIT_SECONDS", 20, minimum=0)
+HYBRID_END_TOLERANCE_SECONDS = 2
+# A yt-dlp kinyeres/letoltes kulon folyamatokban fut, hogy a timeout tenyleg leallitsa es ne vegye el a GIL-t.
+YTDL_POOL_WORKERS = read_int_env("YTDL_POOL_WORKERS", 3, minimum=1)
+YTDL_BACKGROUND_DOWNLOAD_TIMEOUT_SECONDS = 600
 
 ytdl = yt_dlp.YoutubeDL(ytdl_format_options)
 
+sfx_cache = SfxPCMCache(
+    max_bytes=SFX_CACHE_MAX_MB * 1024 * 1024,
+    max_clip_bytes=pcm_bytes_for_seconds(SFX_CACHE_MAX_CLIP_SECONDS),
+)
+sound_bank: Optional[SoundBank] = SoundBank.open(SOUND_BANK_FILE, BASE_DIR)
+retired_sound_banks: list[SoundBank] = []
+retired_sound_banks_lock = threading.Lock()
+# A kovetkezo sorbejegyzes forrasa itt epul, nem a mixer (audio) szalan.
+queue_preroll_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="queue-preroll")
+# A track cache fajljait a hatterben a zenei hangerore kodoljuk at (Opus passthrough a kovetkezo lejatszastol).
+track_level_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="track-level")
+pending_track_levels: set[str] = set()
+loudness_index: Optional[LoudnessIndex] = (
+    LoudnessIndex(LOUDNESS_INDEX_FILE, target_lufs=LOUDNESS_TARGET_LUFS)
+    if LOUDNESS_NORMALIZATION_ENABLED
+    else None
+)
+# A zenei hangero bele van egetve a cache-be, igy a cache-bol jatszott szam Opus passthrough-ra kepes.
+music_cache = OpusLibraryCache(MUSIC_CACHE_DIR, gain=MUSIC_DEFAULT_VOLUME, loudness=loudness_index)
+track_cache: Optional[TrackCache] = (
+    TrackCache(TRACK_CACHE_DIR, max_bytes=TRACK_CACHE_MAX_MB * 1024 * 1024) if TRACK_CACHE_MAX_MB else None
+)
+ytdl_pool = YTDLProcessPool(ytdl_format_options, max_workers=YTDL_POOL_WORKERS)
+background_track_downloads: dict[str, Future] = {}
+metadata_cache: Optional[YTDLMetadataCache] = (
+    YTDLMetadataCache(
+        YTDL_METADATA_CACHE_FILE,
+        search_ttl_seconds=YTDL_SEARCH_CACHE_TTL_MINUTES * 60,
+        info_ttl_seconds=YTDL_INFO_CACHE_TTL_HOURS * 3600,
+        stream_ttl_seconds=YTDL_STREAM_URL_CACHE_TTL_MINUTES * 60,
+        max_entries=YTDL_METADATA_CACHE_MAX_ENTRIES,
+    )
+    if YTDL_METADATA_CACHE_MAX_ENTRIES
+    else None
+)
+
 
 def cleanup_audio_source(source: Optional[discord.AudioSource]) -> None:
     if not source:
@@ -134,8 +269,9 @@ def cleanup_audio_source(source: Optional[discord.AudioSource]) -> None:
 
 
 class PrefixedSilenceAudioSource(discord.AudioSource):
-    def __init__(self, source: discord.AudioSource, *, lead_in_ms: int):
+    def __init__(self, source: discord.AudioSource, *, lead_in_ms: int, gain: float = 1.0):
         self.source = source
+        self.gain = gain
         self.remaining_lead_frames = max(0, int(lead_in_ms / 20))
 
     def read(self) -> bytes:
@@ -151,13 +287,261 @@ class PrefixedSilenceAudioSource(discord.AudioSource):
         return False
 
 
+class PassthroughFFmpegSource(discord.AudioSource):
+    def __init__(
+        self,
+        path: str,
+        *,
+        before_options: Optional[str] = None,
+        options: str = "-vn",
+        opus_passthrough: bool = False,
+        priority: FFmpegPriority = FFmpegPriority.MUSIC,
+        label: Optional[str] = None,
+    ):
+        self.path = path
+        self.before_options = before_options
+        self.options = options
+        self.opus_passthrough = opus_passthrough and OPUS_PASSTHROUGH_ENABLED
+        self.priority = priority
+        self.label = (label or os.path.basename(path) or path)[:80]
+        self.position_frames = 0
+        self._pcm_source: Optional[discord.FFmpegPCMAudio] = None
+        self._opus_source: Optional[discord.FFmpegOpusAudio] = None
+        self._slot = None
+        self._closed = False
+
+    def _seek_before_options(self) -> Optional[str]:
+        parts = [self.before_options] if self.before_options else []
+        if self.position_frames:
+            parts.append(f"-ss {self.position_frames * FRAME_DURATION_MS / 1000:.3f}")
+        return " ".join(parts) or None
+
+    def _close_decoders(self, *, keep_slot: bool = False) -> None:
+        pcm_source, opus_source = self._pcm_source, self._opus_source
+        slot = None if keep_slot else self._slot
+        self._pcm_source = None
+        self._opus_source = None
+        if not keep_slot:
+            self._slot = None
+        cleanup_audio_source(pcm_source)
+        cleanup_audio_source(opus_source)
+        if slot is not None:
+            slot.release()
+
+    def _spawn(self, factory: Callable[[], discord.AudioSource]) -> Optional[discord.AudioSource]:
+        # A dekoder csak akkor indul, ha a globalis ffmpeg keretben van hely; addig a reader szal var.
+        # Mar befogadott forras (PCM/Opus modvaltas, fajlra atallas) a sajat helyet viszi tovabb, nem all ujra sorba.
+        self._close_decoders(keep_slot=True)
+        slot, self._slot = self._slot, None
+        if slot is None:
+            slot = ffmpeg_budget.acquire(self.priority, self.label)
+        if self._closed:
+            slot.release()
+            return None
+        try:
+            source = factory()
+        except Exception:
+            slot.release()
+            raise
+        slot.attach(source)
+        self._slot = slot
+        return source
+
+    def read(self) -> bytes:
+        if self._closed:
+            return b""
+        source = self._pcm_source
+        if source is None:
+            source = self._pcm_source = self._spawn(
+                lambda: discord.FFmpegPCMAudio(
+                    self.path, before_options=self._seek_before_options(), options=self.options
+                )
+            )
+            if source is None or self._closed:
+                self._close_decoders()
+                return b""
+        data = source.read()
+        if data:
+            self.position_frames += 1
+        return data
+
+    def read_opus(self) -> bytes:
+        if self._closed:
+            return b""
+        source = self._opus_source
+        if source is None:
+            source = self._opus_source = self._spawn(
+                lambda: discord.FFmpegOpusAudio(
+                    self.path,
+                    codec="copy",
+                    before_options=self._seek_before_options(),
+                    options=self.options,
+                )
+            )
+            if source is None or self._closed:
+                self._close_decoders()
+                return b""
+        packet = source.read()
+        if packet:
+            self.position_frames += 1
+        return packet
+
+    def cleanup(self) -> None:
+        self._closed = True
+        self._close_decoders()
+
+    def is_opus(self):
+        return False
+
+
+class HybridStreamSource(PassthroughFFmpegSource):
+    # Streambol szol; ha a stream a vart vege elott megszakad, a hatterben letoltott fajlbol folytatja
+    # ugyanattol a poziciotol. A read a BufferedAudioSource reader szalan fut, ott szabad varni a letoltesre.
+    def __init__(self, url: str, *, download: Future, duration: float, **kwargs):
+        super().__init__(url, **kwargs)
+        self.download = download
+        self.expected_frames = seconds_to_frames(duration)
+        self.switched_to_file = False
+
+    def _switch_to_file(self) -> bool:
+        if self.switched_to_file or self._closed:
+            return False
+        if self.expected_frames - self.position_frames <= seconds_to_frames(HYBRID_END_TOLERANCE_SECONDS):
+            return False
+        try:
+            _, path, _ = self.download.result(timeout=HYBRID_SWITCH_WAIT_SECONDS)
+        except Exception as e:
+            logger.warning("Stream interrupted and no downloaded file to resume from (%s): %s", self.label, e)
+            return False
+        if self._closed:
+            return False
+        logger.info(
+            "Stream interrupted, resuming from downloaded file. title=%s position=%.1fs",
+            self.label,
+            self.position_frames / FRAMES_PER_SECOND,
+        )
+        self._close_decoders(keep_slot=True)
+        self.path = path
+        self.before_options = None
+        self.switched_to_file = True
+        return True
+
+    def read(self) -> bytes:
+        data = super().read()
+        if not data and self._switch_to_file():
+            data = super().read()
+        return data
+
+    def read_opus(self) -> bytes:
+        packet = super().read_opus()
+        if not packet and self._switch_to_file():
+            packet = super().read_opus()
+        return packet
+
+
+def music_level(normalization_gain: Optional[float]) -> float:
+    # Egyseges zenei hangero minden uton: hangossag-normalizalas (ismeretlennel 1.0) szorozva a MUSIC_VOLUME_PERCENT-tel.
+    return (1.0 if normalization_gain is None else normalization_gain) * MUSIC_DEFAULT_VOLUME
+
+
+def encode_track_level(key: str) -> None:
+    # Blokkolo, a track-level szalon fut. A lejatszas alatt lecserelt eredeti fajlt a track cache
+    # csak az utolso unpin utan torli, igy a mar feloldott (sorban allo) peldanyok tovabb szolhatnak.
+    try:
+        cached = track_cache.peek(key) if track_cache else None
+        if cached is None or cached.get("level"):
+            return
+        target_path = os.path.join(TRACK_CACHE_DIR, f"level-{uuid4().hex}.opus")
+        encoded = music_cache.encode(cached["path"], target_path)
+        if encoded is None:
+            return
+        if track_cache.peek(key) is None:
+            os.remove(target_path)
+            return
+        track_cache.store(
+            key,
+            target_path,
+            cached["info"],
+            level={"gain": encoded["gain"], "music_volume": encoded["music_volume"]},
+        )
+    except Exception:
+        logger.exception("Track level encode failed. key=%s", key)
+    finally:
+        pending_track_levels.discard(key)
+
+
+def schedule_track_level(key: Optional[str]) -> None:
+    if not key or track_cache is None or key in pending_track_levels:
+        return
+    pending_track_levels.add(key)
+    track_level_executor.submit(encode_track_level, key)
+
+
+def is_opus_encoded(info: Optional[TrackInfo]) -> bool:
+    if not info:
+        return False
+    return str(info.acodec or "").lower() == "opus"
+
+
+def opus_passthrough_reader(source: discord.AudioSource) -> Optional[discord.AudioSource]:
+    if isinstance(source, discord.PCMVolumeTransformer):
+        if abs(source.volume - 1.0) > 1e-3:
+            return None
+        source = source.original
+    if isinstance(source, (PassthroughFFmpegSource, BufferedAudioSource)) and source.opus_passthrough:
+        return source
+    return None
+
+
+def read_passthrough_frame(source: discord.AudioSource) -> tuple[bytes, bool]:
+    # (keret, Opus-e); mod valtas kozben a buffer meg PCM kereteket adhat vissza.
+    if isinstance(source, BufferedAudioSource):
+        return source.read_preferred(True)
+    return source.read_opus(), True
+
+
+def find_frame_buffer(source: Optional[discord.AudioSource]) -> Optional[BufferedAudioSource]:
+    while source is not None and not isinstance(source, BufferedAudioSource):
+        if isinstance(source, discord.PCMVolumeTransformer):
+            source = source.original
+        elif isinstance(source, PrefixedSilenceAudioSource):
+            source = source.source
+        else:
+            return None
+    return source
+
+
+def source_label(source: discord.AudioSource) -> str:
+    if isinstance(source, PrefixedSilenceAudioSource):
+        source = source.source
+    return type(source).__name__
+
+
+def attach_frame_buffer(
+    source: Optional[discord.AudioSource], *, start_opus: bool = False, prefer_opus: bool = True
+) -> Optional[discord.AudioSource]:
+    # A mixer csak ring bufferbol olvas, igy egy lassu dekoder nem fogja meg a 20 ms-os tick-et.
+    # A reader abban a modban indul, amiben a mixer olvasni fogja (Opus passthrough vagy PCM).
+    if source is None or isinstance(source, (BufferedAudioSource, MemoryPCMAudio)):
+        return source
+    if isinstance(source, discord.PCMVolumeTransformer):
+        source.original = attach_frame_buffer(
+            source.original, start_opus=prefer_opus and opus_passthrough_reader(source) is not None
+        )
+        return source
+    if isinstance(source, PrefixedSilenceAudioSource):
+        source.source = attach_frame_buffer(source.source, start_opus=start_opus)
+        return source
+    return BufferedAudioSource(source, capacity_frames=AUDIO_BUFFER_FRAMES, start_opus=start_opus)
+
+
 async def settle_voice_connection(connection_changed: bool) -> None:
     if not connection_changed:
         return
     await asyncio.sleep(VOICE_CONNECTION_SETTLE_SECONDS)
 
 
-def build_ffmpeg_options(*, stream: bool, data: Optional[dict] = None) -> dict:
+def build_ffmpeg_options(*, stream: bool, headers: Optional[dict] = None) -> dict:
     options = {"options": "-vn"}
     if not stream:
         return options
@@ -167,21 +551,22 @@ def build_ffmpeg_options(*, stream: bool, data: Optional[dict] = None) -> dict:
         "-reconnect_streamed 1",
         "-reconnect_delay_max 5",
     ]
-    if data:
-        headers = data.get("http_headers")
-        if headers:
-            header_blob = "".join(f"{key}: {value}\r\n" for key, value in headers.items())
-            escaped_header_blob = header_blob.replace('"', '\\"')
-            before_options_parts.append(f'-headers "{escaped_header_blob}"')
+    if headers:
+        header_blob = "".join(f"{key}: {value}\r\n" for key, value in headers.items())
+        escaped_header_blob = header_blob.replace('"', '\\"')
+        before_options_parts.append(f'-headers "{escaped_header_blob}"')
     options["before_options"] = " ".join(before_options_parts)
     return options
 
 
 def clear_guild_queue(guild_id: int) -> None:
-    queued_sources = song_queues.pop(guild_id, [])
-    titles_queues.pop(guild_id, None)
-    for source in queued_sources:
-        cleanup_audio_source(source)
+    track_queue = song_queues.pop(guild_id, None)
+    queued_tracks = track_queue.clear() if track_queue else []
+    mixer = mixers.get(guild_id)
+    if mixer:
+        mixer.set_next_source(None)
+    for track in queued_tracks:
+        track.release()
 
 
 def get_play_lock(guild_id: int) -> asyncio.Lock:
@@ -218,31 +603,208 @@ def normalize_voice_runtime_error(exc: Exception) -> Exception:
     )
 
 
+def source_remaining_frames(source: Optional[discord.AudioSource]) -> Optional[int]:
+    duration = getattr(source, "duration", None)
+    frame_buffer = find_frame_buffer(source)
+    if frame_buffer is None:
+        return None
+    if frame_buffer.reached_eof:
+        # A forras vege mar a bufferben van: pontosan ennyi frame maradt, hossz nelkul is.
+        return frame_buffer.buffered_frames
+    if not duration:
+        return None
+    return int(duration * FRAMES_PER_SECOND) - frame_buffer.played_frames
+
+
+def _resolve_completion(future: asyncio.Future, finished: bool) -> None:
+    if not future.done():
+        future.set_result(finished)
+
+
+def read_source_frame(source: discord.AudioSource) -> tuple[bytes, float]:
+    # A PCMVolumeTransformer hangerejet a mixer alkalmazza, igy nincs kulon audioop.mul kor.
+    if isinstance(source, discord.PCMVolumeTransformer):
+        return source.original.read(), min(source.volume, 2.0)
+    return source.read(), getattr(source, "gain", 1.0)
+
+
 class MixingAudioSource(discord.AudioSource):
     def __init__(self, main_source: Optional[discord.AudioSource] = None):
         self.is_cleaning_up = False
         self.main_source = main_source
         self.sfx_sources = []
-        self.sample_width = 2
+        self.voice_client: Optional[discord.VoiceClient] = None
+        self.idle_suspended = False
+        self.idle_suspensions = 0
+        self._idle_frames = 0
+        self._suspend_requested = False
         self._lock = threading.Lock()
         self._on_main_end = None
+        # Forras id -> future; a hivo a lejatszas pontos vegere var (True: vegigment, False: megszakadt).
+        self._completions: dict[int, asyncio.Future] = {}
+        # A kovetkezo sorbejegyzes (build_source()-szal); a dekodere csak a pre-roll ablakban epul.
+        self._next_entry = None
+        self._next_source: Optional[discord.AudioSource] = None
+        # A sor on_end-je, amihez a kovetkezo bejegyzes kotve van; csak ennek a fo forrasnak a vegen lep elo.
+        self._next_on_end = None
+        # A pre-roll szalon eppen epulo bejegyzes, es hogy a fo szam vege erre var-e (on_end visszatartva).
+        self._next_building = None
+        self._awaiting_next = False
+        self._last_promoted = None
+        self._fading_source: Optional[discord.AudioSource] = None
+        self._fade_frames_left = 0
+        self._crossfade_frames = CROSSFADE_MS // FRAME_DURATION_MS
+        self._preroll_frames = seconds_to_frames(QUEUE_PREROLL_SECONDS) + self._crossfade_frames
+        self._engine = PCMFrameMixer(
+            LookaheadLimiter(
+                threshold_db=LIMITER_THRESHOLD_DB,
+                lookahead_ms=LIMITER_LOOKAHEAD_MS,
+                release_ms=LIMITER_RELEASE_MS,
+            )
+            if LIMITER_ENABLED
+            else None
+        )
+        self._ducking = DuckingEnvelope(
+            depth=DUCK_DEPTH_PERCENT / 100,
+            attack_ms=DUCK_ATTACK_MS,
+            release_ms=DUCK_RELEASE_MS,
+        )
+        self._frames_without_overlay = OPUS_PASSTHROUGH_RESUME_FRAMES
+        self._opus_frame = False
+        self.metrics = MixerMetrics()
 
-    def set_main_source(self, source: Optional[discord.AudioSource], on_end=None):
+    def _track_completion_locked(self, source: Optional[discord.AudioSource]) -> Optional[asyncio.Future]:
+        if source is None:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self._completions[id(source)] = future
+        return future
+
+    def _settle_completions(self, sources: list, *, finished: bool) -> None:
+        with self._lock:
+            futures = [self._completions.pop(id(source), None) for source in sources]
+        for future in futures:
+            if future is None:
+                continue
+            try:
+                future.get_loop().call_soon_threadsafe(_resolve_completion, future, finished)
+            except RuntimeError:
+                # Az event loop mar leallt, nincs ki var ra.
+                pass
+
+    def set_main_source(
+        self, source: Optional[discord.AudioSource], on_end=None
+    ) -> Optional[asyncio.Future]:
         old_source = None
+        source = attach_frame_buffer(source)
         with self._lock:
             old_source = self.main_source
+            fading_source = self._fading_source
             self.main_source = source
             self._on_main_end = on_end
+            self._fading_source = None
+            self._awaiting_next = False
+            dropped_next = self._next_source
+            self._next_entry = None
+            self._next_source = None
+            self._next_on_end = None
+            self._last_promoted = None
+            completion = self._track_completion_locked(source)
+        cleanup_audio_source(dropped_next)
+        interrupted = []
         if old_source and old_source is not source:
             cleanup_audio_source(old_source)
+            interrupted.append(old_source)
+        if fading_source:
+            cleanup_audio_source(fading_source)
+            interrupted.append(fading_source)
+        self._settle_completions(interrupted, finished=False)
+        if source is not None:
+            self._wake()
+        return completion
+
+    def set_next_source(self, entry) -> None:
+        # A kovetkezo szam csak ki van jelolve; a dekodere a pre-roll ablakban epul es indul,
+        # es a read() azonnal atvalt ra, a main on_end-jet orokolve. A bejegyzes a jelenlegi fo
+        # forras sor-callbackjehez kotodik: sor nelkuli forras (pl. TTS) utan nem lep elo.
+        with self._lock:
+            if self._on_main_end is None:
+                entry = None
+            self._next_on_end = self._on_main_end
+            if entry is self._next_entry:
+                return
+            dropped_next = self._next_source
+            self._next_entry = entry
+            self._next_source = None
+        cleanup_audio_source(dropped_next)
+
+    def skip_to_next(self) -> bool:
+        # Atugras: ha a kovetkezo sorbejegyzes mar elore felepult, azonnal arra valt (a sor on_end-je
+        # marad), es a hivo play_next_in_queue-ja csak lepteti a sort. Kulonben a fo forras leall.
+        with self._lock:
+            promoted = self._next_bound_locked() and self._next_source is not None
+            if promoted:
+                old_source = self.main_source
+                fading_source = self._fading_source
+                self._fading_source = None
+                self._awaiting_next = False
+                if old_source is not None:
+                    self._retire_source_locked(old_source)
+                self._promote_next_locked()
+        if not promoted:
+            self.set_main_source(None)
+            return False
+        interrupted = [source for source in (old_source, fading_source) if source is not None]
+        for source in interrupted:
+            cleanup_audio_source(source)
+        self._settle_completions(interrupted, finished=False)
+        self._wake()
+        return True
+
+    def owns_source(self, entry) -> bool:
+        with self._lock:
+            return entry is self.main_source or entry is self._last_promoted
 
     def has_main_source(self) -> bool:
         with self._lock:
             return self.main_source is not None
 
-    def add_sfx(self, source: discord.AudioSource):
+    def add_sfx(self, source: discord.AudioSource) -> asyncio.Future:
+        source = attach_frame_buffer(source)
         with self._lock:
             self.sfx_sources.append(source)
+            completion = self._track_completion_locked(source)
+        self._wake()
+        return completion
+
+    def _wake(self) -> None:
+        self._idle_frames = 0
+        if not self.idle_suspended:
+            return
+        self.idle_suspended = False
+        voice_client = self.voice_client
+        if voice_client and voice_client.is_connected() and voice_client.is_paused():
+            voice_client.resume()
+            logger.debug("Mixer resumed from idle suspension. guild=%s", voice_client.guild.id)
+
+    def _suspend_if_idle(self) -> None:
+        # Az event loopon fut, ugyanott, ahol az add_sfx/set_main_source, igy nincs verseny a felebresztessel.
+        self._suspend_requested = False
+        voice_client = self.voice_client
+        if (
+            self.is_cleaning_up
+            or self.idle_suspended
+            or self.has_active_audio()
+            or self._idle_frames < MIXER_IDLE_SUSPEND_FRAMES
+            or not voice_client
+            or not voice_client.is_connected()
+            or not voice_client.is_playing()
+        ):
+            return
+        self.idle_suspended = True
+        self.idle_suspensions += 1
+        voice_client.pause()
+        logger.debug("Mixer suspended while idle. guild=%s", voice_client.guild.id)
 
     def has_sfx(self) -> bool:
         with self._lock:
@@ -250,57 +812,265 @@ class MixingAudioSource(discord.AudioSource):
 
     def has_active_audio(self) -> bool:
         with self._lock:
-            return self.main_source is not None or bool(self.sfx_sources)
-
-    def _mix(self, base: bytes, overlay: bytes) -> bytes:
-        if not base:
-            return overlay
-        if not overlay:
-            return base
-        max_len = max(len(base), len(overlay))
-        if len(base) < max_len:
-            base += b"\x00" * (max_len - len(base))
-        if len(overlay) < max_len:
-            overlay += b"\x00" * (max_len - len(overlay))
-        return audioop.add(base, overlay, self.sample_width)
+            return (
+                self.main_source is not None
+                or self._fading_source is not None
+                or self._awaiting_next
+                or bool(self.sfx_sources)
+            )
+
+    def _retire_source_locked(self, source: discord.AudioSource) -> None:
+        frame_buffer = find_frame_buffer(source)
+        if frame_buffer is not None:
+            self.metrics.finished_underruns += frame_buffer.underruns
+
+    def _next_bound_locked(self) -> bool:
+        return (
+            self._next_entry is not None
+            and self._on_main_end is not None
+            and self._on_main_end is self._next_on_end
+        )
+
+    def _preroll_next_locked(self) -> None:
+        if not self._next_bound_locked():
+            return
+        remaining = source_remaining_frames(self.main_source)
+        # Ismeretlen hatralevo idonel nem epitunk elore, kulonben a dekoder az egesz szam alatt
+        # foglalna egy ffmpeg helyet; ilyenkor a buffer EOF-ja vagy a szam vege inditja az epitest.
+        if self._next_source is None and remaining is not None and remaining <= self._preroll_frames:
+            self._request_next_build_locked()
+        if (
+            self._crossfade_frames
+            and self._next_source is not None
+            and self._fading_source is None
+            and remaining is not None
+            and remaining <= self._crossfade_frames
+        ):
+            next_buffer = find_frame_buffer(self._next_source)
+            if next_buffer is None or next_buffer.buffered_frames:
+                self._fading_source = self.main_source
+                self._fade_frames_left = max(1, remaining)
+                self._promote_next_locked()
+
+    def _request_next_build_locked(self) -> None:
+        entry = self._next_entry
+        if not self._next_bound_locked() or self._next_source is not None or self._next_building is entry:
+            return
+        self._next_building = entry
+        # Crossfade vagy overlay alatt az uj szamot PCM-ben olvassuk, kulonben Opus passthrough-ban.
+        prefer_opus = not self._crossfade_frames and not self.sfx_sources
+        queue_preroll_executor.submit(self._build_next, entry, prefer_opus)
+
+    def _build_next(self, entry, prefer_opus: bool) -> None:
+        # A pre-roll szalon fut; a mixer zarat csak a kesz forras behelyezesere fogjuk meg.
+        try:
+            source = attach_frame_buffer(entry.build_source(prefer_opus=prefer_opus), prefer_opus=prefer_opus)
+        except Exception as e:
+            logger.warning("Failed to build next queued track (%s): %s", getattr(entry, "title", "?"), e)
+            source = None
+        with self._lock:
+            if self._next_building is entry:
+                self._next_building = None
+            current = self._next_entry is entry
+            if current and source is not None:
+                self._next_source = source
+            elif current:
+                self._next_entry = None
+        if not current:
+            cleanup_audio_source(source)
+
+    def _promote_next_locked(self) -> bool:
+        next_source = self._next_source
+        if not self._next_bound_locked() or next_source is None:
+            return False
+        self.main_source = next_source
+        self._last_promoted = self._next_entry
+        self._next_entry = None
+        self._next_source = None
+        return True
+
+    def _read_main_locked(self, engine: PCMFrameMixer, duck_envelope) -> tuple[bytes, bytes]:
+        source = self.main_source
+        source_started_at = time.perf_counter()
+        passthrough = None
+        if self._frames_without_overlay >= OPUS_PASSTHROUGH_RESUME_FRAMES and self._ducking.settled:
+            passthrough = opus_passthrough_reader(source)
+        opus_packet = b""
+        if passthrough is not None:
+            main_data, is_opus = read_passthrough_frame(passthrough)
+            if is_opus:
+                opus_packet = main_data
+            elif main_data:
+                # Valtas kozben a meg PCM-ben pufferelt keretek a mixeren at szolnak, csend nelkul.
+                engine.add(main_data, self._ducking.gain)
+        else:
+            main_data, main_gain = read_source_frame(source)
+            if main_data:
+                if self._fading_source is not None:
+                    main_gain *= 1.0 - self._fade_frames_left / max(1, self._crossfade_frames)
+                if duck_envelope is not None:
+                    engine.add_enveloped(main_data, main_gain, duck_envelope)
+                else:
+                    engine.add(main_data, main_gain * self._ducking.gain)
+        self.metrics.record_source("main", source_label(source), time.perf_counter() - source_started_at)
+        return main_data, opus_packet
+
+    def _read_fading_locked(self, engine: PCMFrameMixer, ended_sources: list) -> None:
+        source = self._fading_source
+        source_started_at = time.perf_counter()
+        data, gain = read_source_frame(source)
+        self.metrics.record_source("fade", source_label(source), time.perf_counter() - source_started_at)
+        self._fade_frames_left -= 1
+        if data:
+            engine.add(data, gain * self._fade_frames_left / max(1, self._crossfade_frames))
+        if not data or self._fade_frames_left <= 0:
+            self._retire_source_locked(source)
+            ended_sources.append(source)
+            self._fading_source = None
 
     def read(self) -> bytes:
-        main_data = b""
-        sfx_datas = []
+        started_at = time.perf_counter()
+        metrics = self.metrics
         on_end = None
         ended_sources = []
+        opus_packet = b""
+        engine = self._engine
+        engine.begin()
 
         with self._lock:
+            if self._awaiting_next and self._next_building is None:
+                # A fo szam mar veget ert; a kovetkezo most keszult el (vagy nem sikerult felepiteni).
+                self._awaiting_next = False
+                on_end = self._on_main_end
+                if not self._promote_next_locked():
+                    self._on_main_end = None
+
+            if self.main_source:
+                previous_main = self.main_source
+                self._preroll_next_locked()
+                if self.main_source is not previous_main:
+                    # Crossfade indult: a sor szempontjabol a regi szam itt er veget.
+                    on_end = self._on_main_end
+
+            if self.sfx_sources or self._fading_source is not None:
+                self._frames_without_overlay = 0
+            elif self._frames_without_overlay < OPUS_PASSTHROUGH_RESUME_FRAMES:
+                self._frames_without_overlay += 1
+
+            if self._fading_source is not None:
+                self._read_fading_locked(engine, ended_sources)
+
+            duck_envelope = None
+            if self._ducking.enabled:
+                # A zene az overlay teljes idejere (a lead-in csenddel egyutt) lehalkul.
+                duck_envelope = self._ducking.advance(bool(self.sfx_sources))
+
             if self.main_source:
-                main_data = self.main_source.read()
+                main_data, opus_packet = self._read_main_locked(engine, duck_envelope)
                 if not main_data:
+                    self._retire_source_locked(self.main_source)
                     ended_sources.append(self.main_source)
                     on_end = self._on_main_end
                     self.main_source = None
-                    self._on_main_end = None
+                    if self._promote_next_locked():
+                        # Gapless atmenet: ugyanebben a tick-ben mar az uj szam elso frame-je szol.
+                        main_data, opus_packet = self._read_main_locked(engine, duck_envelope)
+                    else:
+                        self._request_next_build_locked()
+                        if self._next_bound_locked() and self._next_building is self._next_entry:
+                            # A kovetkezo szam meg epul: a sor leptetese (on_end) megvarja.
+                            self._awaiting_next = True
+                            on_end = None
+                        else:
+                            self._on_main_end = None
             sfx_remaining = []
             for source in self.sfx_sources:
-                data = source.read()
+                source_started_at = time.perf_counter()
+                data, gain = read_source_frame(source)
+                metrics.record_source(
+                    "sfx", source_label(source), time.perf_counter() - source_started_at
+                )
                 if data:
-                    sfx_datas.append(data)
+                    engine.add(data, gain)
                     sfx_remaining.append(source)
                 else:
+                    self._retire_source_locked(source)
                     ended_sources.append(source)
             self.sfx_sources = sfx_remaining
+            overlay_count = len(sfx_remaining)
 
         for source in ended_sources:
             cleanup_audio_source(source)
-
-        mixed = main_data
-        for data in sfx_datas:
-            mixed = self._mix(mixed, data)
+        if ended_sources:
+            self._settle_completions(ended_sources, finished=True)
 
         if on_end:
             bot.loop.call_soon_threadsafe(asyncio.create_task, on_end())
 
-        if mixed:
-            return mixed
-        return PCM_SILENCE_FRAME
+        # Az is_opus() a read() utan, ugyanazon a szalon kerul lekerdezesre.
+        self._opus_frame = bool(opus_packet)
+        if opus_packet:
+            frame = opus_packet
+            engine.reset_limiter()
+        elif engine.layer_count:
+            frame = engine.render()
+        else:
+            frame = PCM_SILENCE_FRAME
+            engine.reset_limiter()
+
+        if (
+            frame is PCM_SILENCE_FRAME
+            and self.main_source is None
+            and self._fading_source is None
+            and not self._awaiting_next
+        ):
+            self._idle_frames += 1
+            if self._idle_frames >= MIXER_IDLE_SUSPEND_FRAMES and not self._suspend_requested:
+                self._suspend_requested = True
+                bot.loop.call_soon_threadsafe(self._suspend_if_idle)
+        else:
+            self._idle_frames = 0
+        metrics.record_frame(
+            time.perf_counter() - started_at,
+            silence=frame is PCM_SILENCE_FRAME,
+            opus=self._opus_frame,
+            overlays=overlay_count,
+        )
+        return frame
+
+    def stats_snapshot(self) -> dict:
+        with self._lock:
+            sources = [self.main_source, self._next_source, self._fading_source, *self.sfx_sources]
+            main_title = getattr(self.main_source, "title", None)
+            next_title = getattr(self._next_entry, "title", None)
+        live_underruns = 0
+        buffers = []
+        for source in sources:
+            frame_buffer = find_frame_buffer(source)
+            if frame_buffer is None:
+                continue
+            live_underruns += frame_buffer.underruns
+            buffers.append(
+                {
+                    "source": source_label(source),
+                    "buffered_seconds": round(frame_buffer.buffered_seconds, 2),
+                    "fill_level": round(frame_buffer.fill_level, 3),
+                    "target_frames": frame_buffer.target_frames,
+                    "underruns": frame_buffer.underruns,
+                    "underrun_events": frame_buffer.underrun_events,
+                }
+            )
+        snapshot = self.metrics.snapshot(live_underruns=live_underruns)
+        snapshot["main_title"] = main_title
+        snapshot["next_title"] = next_title
+        snapshot["next_prerolled"] = sources[1] is not None
+        snapshot["duck_gain"] = round(self._ducking.gain, 3)
+        snapshot["idle_suspended"] = self.idle_suspended
+        snapshot["idle_suspensions"] = self.idle_suspensions
+        limiter = self._engine.limiter
+        snapshot["limiter"] = limiter.snapshot() if limiter is not None else None
+        snapshot["buffers"] = buffers
+        return snapshot
 
     def cleanup(self):
         if self.is_cleaning_up:
@@ -308,24 +1078,39 @@ class MixingAudioSource(discord.AudioSource):
         self.is_cleaning_up = True
         logger.debug("Cleaning up MixingAudioSource.")
         with self._lock:
+            interrupted = [
+                source
+                for source in (self.main_source, self._fading_source, *self.sfx_sources)
+                if source is not None
+            ]
             if self.main_source:
                 cleanup_audio_source(self.main_source)
                 self.main_source = None
+            if self._fading_source:
+                cleanup_audio_source(self._fading_source)
+                self._fading_source = None
+            self._next_entry = None
+            self._awaiting_next = False
+            if self._next_source:
+                cleanup_audio_source(self._next_source)
+                self._next_source = None
             for source in self.sfx_sources:
                 cleanup_audio_source(source)
             self.sfx_sources.clear()
+        self._settle_completions(interrupted, finished=False)
 
     def is_opus(self):
-        return False
+        return self._opus_frame
 
 
 class YTDLSource(discord.PCMVolumeTransformer):
-    def __init__(self, source, *, data, temp_file: Optional[str] = None, volume=0.5):
+    def __init__(self, source, *, track: "ResolvedTrack", volume=MUSIC_DEFAULT_VOLUME):
         super().__init__(source, volume)
-        self.data = data
-        self.title = data.get("title") or "Ismeretlen cim"
-        self.url = data.get("url")
-        self.temp_file = temp_file
+        self.track = track
+        self.info = track.info
+        self.title = track.title
+        self.url = track.info.url
+        self.duration = track.duration
 
     @staticmethod
     def _resolve_downloaded_filename(data: dict) -> str:
@@ -336,49 +1121,328 @@ class YTDLSource(discord.PCMVolumeTransformer):
                 return file_path
         return ytdl.prepare_filename(data)
 
+    @staticmethod
+    def _first_entry(data: Optional[dict]) -> Optional[dict]:
+        if data and "entries" in data:
+            return next((entry for entry in data["entries"] if entry), None)
+        return data
+
+    @staticmethod
+    def _lookup_cached_url(url: str) -> tuple[Optional[str], Optional[dict], Optional[dict]]:
+        # Blokkolo (index/metaadat): (cache kulcs, cache bejegyzes, metaadat info) halozati kinyeres nelkul.
+        info = metadata_cache.get_info(url) if metadata_cache else None
+        url_key = track_cache.resolve_key(url) or track_cache_key_from_info(info)
+        cached = track_cache.lookup(url_key, count=False) if url_key else None
+        if cached is not None:
+            track_cache.remember_url(url, cached["key"])
+        return url_key, cached, info
+
+    @staticmethod
+    def _lookup_stream_info(url: str) -> Optional[dict]:
+        # Blokkolo: a metaadat cache-ben levo, a szam vegeig meg ervenyes stream URL-es info.
+        info = metadata_cache.get_info(url) if metadata_cache else None
+        return info if info and info.get("url") else None
+
+    @staticmethod
+    def _remember_info(url: str, data: dict) -> None:
+        if metadata_cache and not data.get(METADATA_CACHED_FIELD):
+            metadata_cache.put_info(url, data)
+
+    @classmethod
+    def _lookup_cached_info(
+        cls, url: str, data: dict, url_key: Optional[str]
+    ) -> tuple[Optional[str], Optional[dict]]:
+        # Blokkolo: a (frissen kinyert vagy cache-bol jott) info alapjan meg egyszer megnezzuk a cache-t.
+        cls._remember_info(url, data)
+        key = track_cache_key_from_info(data)
+        cached = None
+        if key and key != url_key:
+            cached = track_cache.lookup(key, count=False)
+            if cached is not None:
+                track_cache.remember_url(url, key)
+        return key, cached
+
+    @classmethod
+    async def _extract_track(
+        cls, url: str, *, guild_id=None
+    ) -> tuple[Optional[dict], Optional[str], Optional[dict]]:
+        # (info, cache kulcs, cache bejegyzes); cache talalatnal vagy meg ervenyes, cache-elt stream
+        # URL-nel nincs halozati kinyeres. A track cache feloldasonkent egyszer szamol talalatot/hianyt.
+        loop = asyncio.get_running_loop()
+        url_key, cached, info = await loop.run_in_executor(None, cls._lookup_cached_url, url)
+        if cached is not None:
+            track_cache.record_lookup(True)
+            return cached["info"], cached["key"], cached
+
+        if info and info.get("url"):
+            data = info
+        else:
+            data = cls._first_entry(await ytdl_pool.extract_info(url, guild_id=guild_id))
+        if not data:
+            return None, None, None
+        key, cached = await loop.run_in_executor(None, cls._lookup_cached_info, url, data, url_key)
+        track_cache.record_lookup(cached is not None)
+        return data, key, cached
+
     @classmethod
-    async def from_url(cls, url, *, loop=None, stream=False):
+    async def _download_into_cache(
+        cls, url: str, data: dict, key: Optional[str], *, guild_id=None, background: bool = False
+    ) -> tuple[dict, str, Optional[str]]:
+        # A worker a kinyert info masolatabol tolt le, a stream forras a sajat peldanyat hasznalja tovabb.
+        if data.get(METADATA_CACHED_FIELD):
+            # A metaadat cache-bol jott reszhalmazbol nem lehet letolteni, itt kell a teljes kinyeres.
+            data = cls._first_entry(
+                await ytdl_pool.extract_info(url, download=True, guild_id=guild_id, background=background)
+            )
+            if not data:
+                raise RuntimeError("Nem talaltam letoltheto forrast.")
+        else:
+            data = await ytdl_pool.process_ie_result(data, guild_id=guild_id, background=background)
+        filename = cls._resolve_downloaded_filename(data)
+        if not key or track_cache is None:
+            return data, filename, None
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, track_cache.store, key, filename, data)
+        await asyncio.to_thread(track_cache.remember_url, url, key)
+        schedule_track_level(key)
+        return cached["info"], cached["path"], key
+
+    @classmethod
+    def _download_in_background(cls, url: str, data: dict, key: str, *, guild_id=None) -> Future:
+        # A HybridStreamSource a lejatszo szalon var ra, ezert concurrent Future-t adunk vissza.
+        # A pool hatter sorabol fut, igy nem elozi meg ugyanennek a guildnek a kereseseit.
+        download = background_track_downloads.get(key)
+        if download is None or download.done():
+            download = asyncio.run_coroutine_threadsafe(
+                asyncio.wait_for(
+                    cls._download_into_cache(url, data, key, guild_id=guild_id, background=True),
+                    timeout=YTDL_BACKGROUND_DOWNLOAD_TIMEOUT_SECONDS,
+                ),
+                asyncio.get_running_loop(),
+            )
+            background_track_downloads[key] = download
+            download.add_done_callback(lambda finished: cls._background_download_done(key, finished))
+        return download
+
+    @staticmethod
+    def _background_download_done(key: str, download: Future) -> None:
+        background_track_downloads.pop(key, None)
+        if download.cancelled():
+            return
+        error = download.exception()
+        if error is not None:
+            logger.warning("Background track download failed. key=%s error=%s", key, error)
+
+    @staticmethod
+    def _can_stream_first(info: TrackInfo) -> bool:
+        # A megszakadt stream felismeresehez ismert hossz kell; elo adast nem lehet fajlbol folytatni.
+        return bool(HYBRID_PLAYBACK_ENABLED and info.url and info.duration and not info.is_live)
+
+    @classmethod
+    async def resolve(
+        cls, url, *, loop=None, stream=False, guild_id=None, defer_download=False
+    ) -> "ResolvedTrack":
+        # Csak a halozati/cache munka; a dekoder a ResolvedTrack.build_source()-ban jon letre.
+        # A wait_for megszakitasa a pool workeret is leallitja, nem marad arva letoltes.
         loop = loop or asyncio.get_event_loop()
+        deadline = loop.time() + YTDL_FETCH_TIMEOUT_SECONDS
+        cache_key = None
+        cached = None
+        download = None
+        start_download = None
         try:
-            data = await asyncio.wait_for(
-                loop.run_in_executor(None, lambda: ytdl.extract_info(url, download=not stream)),
-                timeout=YTDL_FETCH_TIMEOUT_SECONDS,
-            )
+            # Track cache nelkul a meg ervenyes, cache-elt stream URL-bol szolunk, kinyeres es letoltes nelkul.
+            cached_stream = None
+            if stream or track_cache is None:
+                cached_stream = await loop.run_in_executor(None, cls._lookup_stream_info, url)
+            if cached_stream is not None:
+                data, filename, stream = cached_stream, cached_stream["url"], True
+            elif stream:
+                data = cls._first_entry(
+                    await asyncio.wait_for(
+                        ytdl_pool.extract_info(url, guild_id=guild_id),
+                        timeout=YTDL_FETCH_TIMEOUT_SECONDS,
+                    )
+                )
+                filename = data["url"] if data else None
+                if data:
+                    await loop.run_in_executor(None, cls._remember_info, url, data)
+            elif track_cache is None:
+                data = cls._first_entry(
+                    await asyncio.wait_for(
+                        ytdl_pool.extract_info(url, download=True, guild_id=guild_id),
+                        timeout=YTDL_FETCH_TIMEOUT_SECONDS,
+                    )
+                )
+                filename = cls._resolve_downloaded_filename(data) if data else None
+                if data:
+                    await loop.run_in_executor(None, cls._remember_info, url, data)
+            else:
+                data, cache_key, cached = await asyncio.wait_for(
+                    cls._extract_track(url, guild_id=guild_id),
+                    timeout=YTDL_FETCH_TIMEOUT_SECONDS,
+                )
+                if cached is not None:
+                    filename = cached["path"]
+                    if not cached.get("level"):
+                        schedule_track_level(cache_key)
+                elif data and cache_key and cls._can_stream_first(TrackInfo.from_info(data)):
+                    filename = data["url"]
+                    start_download = functools.partial(
+                        cls._download_in_background, url, data, cache_key, guild_id=guild_id
+                    )
+                    if not defer_download:
+                        download, start_download = start_download(), None
+                elif data:
+                    data, filename, cache_key = await asyncio.wait_for(
+                        cls._download_into_cache(url, data, cache_key, guild_id=guild_id),
+                        timeout=max(0.0, deadline - loop.time()),
+                    )
+                else:
+                    filename = None
         except asyncio.TimeoutError as e:
             raise RuntimeError("A zene letoltese tul sok ideig tartott, probald ujra.") from e
-        if not data:
+        if not data or not filename:
             raise RuntimeError("Nem talaltam lejatszhato forrast.")
-        if "entries" in data:
-            data = next((entry for entry in data["entries"] if entry), None)
-            if not data:
-                raise RuntimeError("Nem talaltam lejatszhato forrast.")
 
-        filename = data["url"] if stream else cls._resolve_downloaded_filename(data)
-        ffmpeg_source = discord.FFmpegPCMAudio(
-            filename, **build_ffmpeg_options(stream=stream, data=data)
+        streaming = stream or download is not None or start_download is not None
+        # A teljes info dict itt eldobhato; csak a kompakt rekord marad a forrasban es a sorban.
+        info = TrackInfo.from_info(data)
+        level = cached.get("level") if cached is not None else None
+        volume = music_level(None)
+        if level and level.get("music_volume"):
+            # A normalizalas es a zenei hangero mar a fajlban van; valtozatlan beallitassal 1.0 -> Opus passthrough.
+            volume = MUSIC_DEFAULT_VOLUME / level["music_volume"]
+        elif not streaming and loudness_index:
+            # Ugyanaz a tartalom ugyanazt a hash-t adja, igy egy ujra letoltott szam mar normalizalva szol.
+            gain = await loop.run_in_executor(None, loudness_index.resolve_gain, filename)
+            volume = music_level(gain)
+        return ResolvedTrack(
+            info,
+            location=filename,
+            stream=stream,
+            download=download,
+            start_download=start_download,
+            cache_key=cache_key,
+            # A cache-ben levo fajl marad; csak a cache nelkul letoltott fajlt toroljuk.
+            temp_file=None if streaming or cache_key else filename,
+            volume=volume,
+            level_baked=bool(level),
         )
-        temp_file = None if stream else filename
-        return cls(ffmpeg_source, data=data, temp_file=temp_file)
 
     def cleanup(self):
         try:
             super().cleanup()
         finally:
-            if self.temp_file and os.path.exists(self.temp_file):
-                try:
-                    os.remove(self.temp_file)
-                except OSError as e:
-                    logger.warning(
-                        "Temp audio cleanup failed (%s): %s", self.temp_file, e
-                    )
-                finally:
-                    self.temp_file = None
+            track, self.track = self.track, None
+            if track is not None:
+                track.release()
+
+
+class ResolvedTrack:
+    # Konnyu, sorba allithato szam: fajl vagy stream URL, metaadat, de meg nincs ffmpeg.
+    # Referenciaszamlalt: a sor es minden belole epitett forras tart egy referenciat; az utolso
+    # elengedesekor szabadul fel a cache pin es torlodik az ideiglenes fajl.
+    def __init__(
+        self,
+        info: TrackInfo,
+        *,
+        location: str,
+        stream: bool = False,
+        download: Optional[Future] = None,
+        start_download: Optional[Callable[[], Future]] = None,
+        cache_key: Optional[str] = None,
+        temp_file: Optional[str] = None,
+        volume: float = MUSIC_DEFAULT_VOLUME,
+        level_baked: bool = False,
+    ):
+        self.info = info
+        self.title = info.title
+        self.duration = info.duration
+        self.location = location
+        self.stream = stream
+        self.download = download
+        self._start_download = start_download
+        self.cache_key = cache_key
+        self.temp_file = temp_file
+        self.volume = volume
+        # A fajl mar Opus, benne a zenei hangerovel (track-level atkodolas).
+        self.level_baked = level_baked
+        # A sor duplikacio-szuresehez: ugyanaz a video mas URL-rol is ugyanaz a szam.
+        self.identity = track_cache_key(info.extractor, info.id) or info.webpage_url or location
+        self._refs = 1
+        self._refs_lock = threading.Lock()
+        if cache_key and track_cache:
+            track_cache.pin(cache_key)
+
+    def _retain(self) -> None:
+        with self._refs_lock:
+            self._refs += 1
+
+    def release(self) -> None:
+        with self._refs_lock:
+            if self._refs <= 0:
+                return
+            self._refs -= 1
+            if self._refs:
+                return
+        if self.cache_key and track_cache:
+            track_cache.unpin(self.cache_key)
+        if self.temp_file and os.path.exists(self.temp_file):
+            try:
+                os.remove(self.temp_file)
+            except OSError as e:
+                logger.warning("Temp audio cleanup failed (%s): %s", self.temp_file, e)
+
+    def start_download(self) -> None:
+        # Az event loopon hivando; a halasztott hatterletoltes csak a kivalasztott szamnal indul el.
+        start_download, self._start_download = self._start_download, None
+        if start_download is not None and self.download is None:
+            self.download = start_download()
+
+    def _downloaded_path(self) -> Optional[str]:
+        download = self.download
+        if download is None or not download.done() or download.exception() is not None:
+            return None
+        return download.result()[1]
+
+    def build_source(self, *, prefer_opus: bool = True) -> "YTDLSource":
+        # Ha a hatterletoltes mar kesz, a stream helyett egybol a fajlbol szol.
+        location = self.location
+        download = self.download
+        downloaded_path = self._downloaded_path()
+        if downloaded_path:
+            location, download = downloaded_path, None
+        streaming = self.stream or download is not None
+        source_options = {
+            **build_ffmpeg_options(stream=streaming, headers=self.info.headers),
+            "opus_passthrough": self.level_baked or is_opus_encoded(self.info),
+            "label": self.title,
+        }
+        if download is not None:
+            ffmpeg_source = HybridStreamSource(
+                location, download=download, duration=self.duration, **source_options
+            )
+        else:
+            ffmpeg_source = PassthroughFFmpegSource(location, **source_options)
+        self._retain()
+        source = YTDLSource(ffmpeg_source, track=self, volume=self.volume)
+        if streaming:
+            # Halozati akadasok ellen a stream nehany masodperccel elore dekodol.
+            source.original = BufferedAudioSource(
+                ffmpeg_source,
+                capacity_frames=seconds_to_frames(STREAM_READAHEAD_SECONDS),
+                max_capacity_frames=seconds_to_frames(STREAM_READAHEAD_MAX_SECONDS),
+                start_opus=prefer_opus and opus_passthrough_reader(source) is not None,
+            )
+        return source
 
 
 class LocalFileSource(discord.PCMVolumeTransformer):
-    def __init__(self, source, *, title, volume=0.5):
+    def __init__(self, source, *, title, volume=MUSIC_DEFAULT_VOLUME, duration: Optional[float] = None):
         super().__init__(source, volume)
         self.title = title
+        self.duration = duration
 
 
 class RouletteGame:
@@ -615,13 +1679,13 @@ class RouletteGame:
 
         async with self.lock:
             await self._cancel_turn_timer()
-            cock = discord.FFmpegPCMAudio("/app/roulette_sounds/cock.mp3", options="-vn")
+            cock = build_roulette_sound("cock.mp3")
             self.mixer.add_sfx(cock)
             await asyncio.sleep(2)
 
             hit = self._roll_hit()
             if hit:
-                bang = discord.FFmpegPCMAudio("/app/roulette_sounds/bang.mp3", options="-vn")
+                bang = build_roulette_sound("bang.mp3")
                 self.mixer.add_sfx(bang)
                 await asyncio.sleep(0.5)
                 await punish_player(ctx, member, self.stake, message_tracker=self.track_message)
@@ -630,7 +1694,7 @@ class RouletteGame:
                 )
                 await self._advance_turn(ctx, eliminated=True)
             else:
-                click = discord.FFmpegPCMAudio("/app/roulette_sounds/click.mp3", options="-vn")
+                click = build_roulette_sound("click.mp3")
                 self.mixer.add_sfx(click)
                 await self._update_turn_message(
                     ctx,
@@ -659,10 +1723,10 @@ class RouletteGame:
 # --- SEGÉDFÜGGVÉNYEK ---
 
 def find_local_music(query):
-    if not os.path.exists("music"):
+    if not os.path.exists(MUSIC_DIR):
         return None
 
-    files = [f for f in os.listdir("music") if f.endswith((".mp3", ".wav", ".m4a"))]
+    files = [f for f in os.listdir(MUSIC_DIR) if f.endswith((".mp3", ".wav", ".m4a"))]
 
     if query in files:
         return query
@@ -675,21 +1739,201 @@ def find_local_music(query):
     return None
 
 
+def build_local_music_player(local_filename: str) -> LocalFileSource:
+    file_path = os.path.join(MUSIC_DIR, local_filename)
+    entry = music_cache.lookup(file_path)
+    if entry:
+        source = PassthroughFFmpegSource(entry["cache_path"], opus_passthrough=True)
+        return LocalFileSource(
+            source, title=local_filename, volume=1.0, duration=entry.get("duration")
+        )
+
+    music_cache.schedule(file_path)
+    gain = loudness_index.cached_gain(file_path) if loudness_index else None
+    return LocalFileSource(
+        PassthroughFFmpegSource(file_path),
+        title=local_filename,
+        volume=music_level(gain),
+    )
+
+
+class LocalTrack:
+    # A helyi zene sorbejegyzese; a cache-t es a hangerot csak lejatszaskor nezzuk meg.
+    def __init__(self, local_filename: str):
+        self.local_filename = local_filename
+        self.title = local_filename
+        self.identity = f"local:{local_filename}"
+        entry = music_cache.lookup(os.path.join(MUSIC_DIR, local_filename))
+        self.duration = entry.get("duration") if entry else None
+
+    def build_source(self, *, prefer_opus: bool = True) -> LocalFileSource:
+        # A frame buffert (es vele az indulo modot) a mixer attach_frame_buffer-e teszi ra.
+        return build_local_music_player(self.local_filename)
+
+    def release(self) -> None:
+        pass
+
+
+async def _search_youtube(text: str, limit: int, *, guild_id=None) -> list[dict]:
+    # A talalatok es a jeloltek info reszhalmaza is a metaadat cache-be kerul.
+    if metadata_cache:
+        cached = metadata_cache.get_search(text, limit)
+        if cached is not None:
+            return cached
+    data = await ytdl_pool.extract_info(f"ytsearch{limit}:{text}", guild_id=guild_id)
+    entries = data.get("entries") if isinstance(data, dict) else None
+    candidates = []
+    seen_urls = set()
+    for entry in entries or []:
+        if not entry:
+            continue
+        candidate_url = entry.get("webpage_url") or entry.get("url")
+        if candidate_url and candidate_url not in seen_urls:
+            seen_urls.add(candidate_url)
+            candidates.append({**entry, "webpage_url": candidate_url})
+    if metadata_cache and candidates:
+        # A teljes bejegyzes (stream URL-lel) kerul a cache-be, igy a jeloltek feloldasa mar nem nyer ki ujra.
+        await asyncio.get_running_loop().run_in_executor(None, metadata_cache.put_search, text, limit, candidates)
+    return [info_subset(candidate) for candidate in candidates]
+
+
+async def search_track_candidates(
+    search_query: str, *, limit: int = YTDL_SEARCH_CANDIDATES, guild_id=None
+) -> list[str]:
+    if not search_query.startswith("ytsearch:"):
+        return [search_query]
+    text = search_query[len("ytsearch:"):]
+    try:
+        candidates = await asyncio.wait_for(
+            _search_youtube(text, limit, guild_id=guild_id),
+            timeout=YTDL_SEARCH_TIMEOUT_SECONDS,
+        )
+    except Exception as e:
+        logger.warning("Search expansion failed for '%s': %s", search_query, e)
+        return [search_query]
+    return [candidate["webpage_url"] for candidate in candidates] or [search_query]
+
+
+async def race_playable_tracks(
+    candidates: list[str], *, guild_id=None
+) -> tuple[Optional[ResolvedTrack], bool, list[Exception]]:
+    # A letoltesek legfeljebb PLAY_RACE_FANOUT szelessegben futnak, mellettuk egyszerre egy stream probalkozas.
+    # A keresesi sorrendben legelol allo sikeres jelolt nyer: ha egy hatrebb allo vegez elobb, a jobb
+    # helyezesuekre meg PLAY_RACE_RANK_GRACE_SECONDS-ig varunk, a nala rosszabbakat azonnal leallitjuk.
+    # A leallitott feladatok yt-dlp workeret a pool megoli.
+    loop = asyncio.get_running_loop()
+    download_queue = list(range(len(candidates)))
+    stream_queue = list(range(len(candidates)))
+    hedge_at = loop.time() + PLAY_STREAM_HEDGE_SECONDS
+    running: dict[asyncio.Task, tuple[int, bool]] = {}
+    errors: list[Exception] = []
+    best: Optional[tuple[int, ResolvedTrack, bool]] = None
+    grace_until = None
+
+    def start(rank: int, stream: bool) -> None:
+        # A hatterletoltest csak a nyertes inditja, igy a vesztesek nem foglalnak pool workert es cache helyet.
+        task = asyncio.create_task(
+            YTDLSource.resolve(
+                candidates[rank], loop=loop, stream=stream, guild_id=guild_id, defer_download=True
+            )
+        )
+        running[task] = (rank, stream)
+
+    def drop_worse(rank: int) -> None:
+        download_queue[:] = [queued for queued in download_queue if queued < rank]
+        stream_queue[:] = [queued for queued in stream_queue if queued < rank]
+        for task, (task_rank, _) in running.items():
+            if task_rank >= rank:
+                task.cancel()
+
+    try:
+        while True:
+            if best is not None and (
+                loop.time() >= grace_until or not any(rank < best[0] for rank, _ in running.values())
+            ):
+                break
+            while download_queue and sum(1 for _, stream in running.values() if not stream) < PLAY_RACE_FANOUT:
+                start(download_queue.pop(0), False)
+            stream_running = any(stream for _, stream in running.values())
+            downloads_exhausted = not download_queue and not running
+            if stream_queue and not stream_running and (loop.time() >= hedge_at or downloads_exhausted):
+                start(stream_queue.pop(0), True)
+            if not running:
+                break
+
+            deadlines = []
+            if stream_queue and not any(stream for _, stream in running.values()):
+                deadlines.append(hedge_at)
+            if grace_until is not None:
+                deadlines.append(grace_until)
+            timeout = max(0.0, min(deadlines) - loop.time()) if deadlines else None
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                rank, stream = running.pop(task)
+                if task.cancelled():
+                    continue
+                error = task.exception()
+                if error is not None:
+                    errors.append(error)
+                    logger.warning(
+                        "%s mode failed for '%s': %s", "Stream" if stream else "Download", candidates[rank], error
+                    )
+                    continue
+                track = task.result()
+                if best is not None and best[0] <= rank:
+                    track.release()
+                    continue
+                if best is not None:
+                    best[1].release()
+                best = (rank, track, stream)
+                if grace_until is None:
+                    grace_until = loop.time() + PLAY_RACE_RANK_GRACE_SECONDS
+                drop_worse(rank)
+    except BaseException:
+        if best is not None:
+            best[1].release()
+        raise
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            results = await asyncio.gather(*running, return_exceptions=True)
+            for result in results:
+                if isinstance(result, ResolvedTrack):
+                    result.release()
+    if best is None:
+        return None, False, errors
+    rank, winner, streamed = best
+    if rank:
+        logger.info("Race won by search result #%s: %s", rank + 1, candidates[rank])
+    winner.start_download()
+    return winner, streamed, errors
+
+
 def get_audio_files(folder: str):
     if not os.path.exists(folder):
         return []
     return [f for f in os.listdir(folder) if f.endswith(".mp3")]
 
 
+def get_prank_files(folder: str):
+    bank = sound_bank
+    if bank and folder in SOUND_BANK_FOLDERS:
+        banked_files = [f for f in bank.filenames_in(folder) if f.endswith(".mp3")]
+        if banked_files:
+            return banked_files
+    return get_audio_files(folder)
+
+
 def select_prank_file():
     if prank_mode == "jimmy":
-        candidates = [("jimmy", f) for f in get_audio_files("jimmy")]
+        candidates = [("jimmy", f) for f in get_prank_files("jimmy")]
     elif prank_mode == "mixed":
-        candidates = [("sounds", f) for f in get_audio_files("sounds")] + [
-            ("jimmy", f) for f in get_audio_files("jimmy")
+        candidates = [("sounds", f) for f in get_prank_files("sounds")] + [
+            ("jimmy", f) for f in get_prank_files("jimmy")
         ]
     else:
-        candidates = [("sounds", f) for f in get_audio_files("sounds")]
+        candidates = [("sounds", f) for f in get_prank_files("sounds")]
 
     if not candidates:
         return None
@@ -753,6 +1997,7 @@ def get_mixer(voice_client: discord.VoiceClient) -> MixingAudioSource:
         return mixer
 
     mixer = MixingAudioSource()
+    mixer.voice_client = voice_client
     mixers[guild_id] = mixer
 
     if voice_client.is_playing() or voice_client.is_paused():
@@ -761,10 +2006,22 @@ def get_mixer(voice_client: discord.VoiceClient) -> MixingAudioSource:
     return mixer
 
 
+def collect_mixer_stats() -> dict[str, dict]:
+    return {str(guild_id): mixer.stats_snapshot() for guild_id, mixer in list(mixers.items())}
+
+
+def is_user_paused(voice_client: Optional[discord.VoiceClient]) -> bool:
+    # Az uresjarati felfuggesztes is pause a discord.py szemeben, de az nem a felhasznalo szuneteltetese.
+    if not voice_client or not voice_client.is_paused():
+        return False
+    source = getattr(voice_client, "source", None)
+    return not (isinstance(source, MixingAudioSource) and source.idle_suspended)
+
+
 def is_voice_client_busy(voice_client: Optional[discord.VoiceClient]) -> bool:
     if not voice_client:
         return False
-    if voice_client.is_paused():
+    if is_user_paused(voice_client):
         return True
 
     source = getattr(voice_client, "source", None)
@@ -775,21 +2032,30 @@ def is_voice_client_busy(voice_client: Optional[discord.VoiceClient]) -> bool:
 
 async def play_next_in_queue(ctx):
     guild_id = ctx.guild.id
-    if guild_id in song_queues and song_queues[guild_id]:
+    if song_queues.get(guild_id):
         voice = ctx.guild.voice_client
         if not voice:
             return
         mixer = get_mixer(voice)
-        source = song_queues[guild_id].pop(0)
-        titles_queues[guild_id].pop(0)
-        mixer.set_main_source(source, on_end=lambda: play_next_in_queue(ctx))
-        await ctx.send(f"▶️ Következő zene: **{source.title}**")
+        track = song_queues[guild_id].popleft()
+        # Ha a mixer mar elore betoltotte es atvaltott ra, csak a sort leptetjuk.
+        if not mixer.owns_source(track):
+            mixer.set_main_source(track.build_source(), on_end=lambda: play_next_in_queue(ctx))
+        track.release()
+        stage_next_in_queue(guild_id, mixer)
+        await ctx.send(f"▶️ Következő zene: **{track.title}**")
+
 
+def stage_next_in_queue(guild_id: int, mixer: MixingAudioSource) -> None:
+    track_queue = song_queues.get(guild_id)
+    mixer.set_next_source(track_queue.peek() if track_queue else None)
 
-def ensure_queue(guild_id: int):
-    if guild_id not in song_queues:
-        song_queues[guild_id] = []
-        titles_queues[guild_id] = []
+
+def ensure_queue(guild_id: int) -> GuildTrackQueue:
+    track_queue = song_queues.get(guild_id)
+    if track_queue is None:
+        track_queue = song_queues[guild_id] = GuildTrackQueue(max_length=QUEUE_MAX_LENGTH)
+    return track_queue
 
 
 def is_owner(guild: discord.Guild, member: discord.Member) -> bool:
@@ -810,21 +2076,89 @@ def can_move(guild: discord.Guild) -> bool:
     return me.guild_permissions.move_members
 
 
+def warm_sfx_cache() -> None:
+    folders = SFX_CACHE_FOLDERS
+    if sound_bank:
+        folders = tuple(folder for folder in folders if folder not in SOUND_BANK_FOLDERS)
+    sfx_cache.warm(folders)
+
+
+def scan_sfx_loudness() -> None:
+    if loudness_index is None:
+        return
+    for folder in LOUDNESS_SFX_FOLDERS:
+        loudness_index.scan(folder)
+
+
+def close_retired_sound_banks() -> None:
+    # A lecserelt bankok addig maradnak nyitva, amig egy jatszo SFX meg hivatkozik rajuk.
+    with retired_sound_banks_lock:
+        retired_sound_banks[:] = [bank for bank in retired_sound_banks if not bank.close()]
+
+
+def rebuild_sound_bank() -> dict:
+    # Blokkolo; csak a refresh_sound_bank() hivja, a zar alatt.
+    global sound_bank
+    stats = build_sound_bank(SOUND_BANK_FILE, BASE_DIR, SOUND_BANK_FOLDERS)
+    if stats["written"] or sound_bank is None:
+        previous, sound_bank = sound_bank, SoundBank.open(SOUND_BANK_FILE, BASE_DIR)
+        if previous is not None:
+            with retired_sound_banks_lock:
+                retired_sound_banks.append(previous)
+    close_retired_sound_banks()
+    return stats
+
+
+async def refresh_sound_bank() -> dict:
+    # A !hangbank es az indulaskori frissites ugyanazt a .tmp fajlt irna, ezert egyszerre csak egy fut.
+    async with sound_bank_rebuild_lock:
+        return await asyncio.get_running_loop().run_in_executor(None, rebuild_sound_bank)
+
+
+def build_cached_pcm_source(
+    path: str,
+    *,
+    loop: bool = False,
+    priority: FFmpegPriority = FFmpegPriority.SFX,
+) -> discord.AudioSource:
+    if retired_sound_banks:
+        close_retired_sound_banks()
+    bank = sound_bank
+    entry = bank.lookup(path) if bank else None
+    if entry:
+        return MemoryPCMAudio(bank.pcm(entry), start=bank.trim_offset(entry), loop=loop)
+
+    pcm = sfx_cache.get(path)
+    if pcm is not None:
+        return MemoryPCMAudio(pcm, loop=loop)
+
+    # Cache miss: most meg ffmpeg jatssza, a hatterben pedig bekerul a cache-be.
+    sfx_cache.prefetch(path)
+    before_options = "-stream_loop -1" if loop else None
+    return PassthroughFFmpegSource(path, before_options=before_options, priority=priority)
+
+
+def build_roulette_sound(name: str) -> discord.AudioSource:
+    return build_cached_pcm_source(os.path.join(ROULETTE_SOUNDS_DIR, name))
+
+
 def build_intro_source():
-    return discord.FFmpegPCMAudio(
-        "/app/roulette_sounds/intro.mp3",
-        before_options="-stream_loop -1",
-        options="-vn",
-    )
+    return build_cached_pcm_source(os.path.join(ROULETTE_SOUNDS_DIR, "intro.mp3"), loop=True)
 
 
-def build_sfx_source(path: str):
+def build_sfx_source(path: str, *, priority: FFmpegPriority = FFmpegPriority.SFX):
+    gain = loudness_index.cached_gain(path) if loudness_index else None
     return PrefixedSilenceAudioSource(
-        discord.FFmpegPCMAudio(path, options="-vn"),
+        build_cached_pcm_source(path, priority=priority),
         lead_in_ms=SFX_LEAD_IN_MS,
+        gain=1.0 if gain is None else gain,
     )
 
 
+def build_tts_source(path: str) -> discord.AudioSource:
+    return PassthroughFFmpegSource(path, priority=FFmpegPriority.SFX, label="tts")
+
+
 async def punish_player(
     ctx,
     member: discord.Member,
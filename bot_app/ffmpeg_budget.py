@@ -0,0 +1,160 @@
+import enum
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Optional
+
+from bot_app.logging_setup import get_logger
+
+
+logger = get_logger(__name__)
+
+
+def _read_positive_int_env(name: str, default: int) -> int:
+    raw_value = str(os.getenv(name) or "").strip()
+    if not raw_value:
+        return default
+    try:
+        return max(1, int(raw_value))
+    except ValueError:
+        logger.warning("Invalid %s=%r. Using default=%s.", name, raw_value, default)
+        return default
+
+
+FFMPEG_MAX_PROCESSES = _read_positive_int_env("FFMPEG_MAX_PROCESSES", 8)
+FFMPEG_MAX_BACKGROUND_PROCESSES = min(
+    FFMPEG_MAX_PROCESSES,
+    _read_positive_int_env("FFMPEG_MAX_BACKGROUND_PROCESSES", max(1, FFMPEG_MAX_PROCESSES // 4)),
+)
+FFMPEG_ADMISSION_TIMEOUT_SECONDS = _read_positive_int_env("FFMPEG_ADMISSION_TIMEOUT_SECONDS", 30)
+
+
+class FFmpegPriority(enum.IntEnum):
+    ALERT = 0
+    SFX = 1
+    MUSIC = 2
+    BACKGROUND = 3
+
+
+class FFmpegBudgetExceeded(RuntimeError):
+    pass
+
+
+class FFmpegSlot:
+    def __init__(self, budget: "FFmpegProcessBudget", token: int, priority: FFmpegPriority, label: str):
+        self.budget = budget
+        self.token = token
+        self.priority = priority
+        self.label = label
+        self.pid: Optional[int] = None
+        self.started_at = time.monotonic()
+        self._released = False
+
+    def attach(self, audio_source) -> None:
+        process = getattr(audio_source, "_process", None)
+        self.pid = getattr(process, "pid", None)
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self.budget._release(self)
+
+    def __enter__(self) -> "FFmpegSlot":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.release()
+
+
+class FFmpegProcessBudget:
+    def __init__(self, max_processes: int, *, max_background_processes: int):
+        self.max_processes = max(1, max_processes)
+        self.max_background_processes = max(1, min(self.max_processes, max_background_processes))
+        self._condition = threading.Condition()
+        self._waiting: list[tuple[int, int]] = []
+        self._tickets = itertools.count()
+        self._live: dict[int, FFmpegSlot] = {}
+        self.admitted = 0
+        self.rejected = 0
+        self.peak_live = 0
+
+    def _background_live(self) -> int:
+        return sum(1 for slot in self._live.values() if slot.priority == FFmpegPriority.BACKGROUND)
+
+    def _can_admit_locked(self, ticket: tuple[int, int]) -> bool:
+        if len(self._live) >= self.max_processes:
+            return False
+        if (
+            ticket[0] == FFmpegPriority.BACKGROUND
+            and self._background_live() >= self.max_background_processes
+        ):
+            return False
+        # Szigoru prioritas: eloszor a riasztasok es SFX-ek, utana a zene, vegul a hatterfeladatok.
+        return self._waiting[0] == ticket
+
+    def acquire(
+        self,
+        priority: FFmpegPriority,
+        label: str,
+        *,
+        timeout: Optional[float] = FFMPEG_ADMISSION_TIMEOUT_SECONDS,
+    ) -> FFmpegSlot:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            ticket = (int(priority), next(self._tickets))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while not self._can_admit_locked(ticket):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self.rejected += 1
+                        raise FFmpegBudgetExceeded(
+                            f"Nincs szabad ffmpeg keret ({self.max_processes} fut), probald ujra kesobb."
+                        )
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+            slot = FFmpegSlot(self, ticket[1], FFmpegPriority(priority), label)
+            self._live[slot.token] = slot
+            self.admitted += 1
+            self.peak_live = max(self.peak_live, len(self._live))
+            return slot
+
+    def _release(self, slot: FFmpegSlot) -> None:
+        with self._condition:
+            self._live.pop(slot.token, None)
+            self._condition.notify_all()
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._condition:
+            live = [
+                {
+                    "label": slot.label,
+                    "priority": slot.priority.name.lower(),
+                    "pid": slot.pid,
+                    "age_seconds": round(now - slot.started_at, 1),
+                }
+                for slot in self._live.values()
+            ]
+            return {
+                "max_processes": self.max_processes,
+                "max_background_processes": self.max_background_processes,
+                "live": len(live),
+                "waiting": len(self._waiting),
+                "peak_live": self.peak_live,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "processes": live,
+            }
+
+
+ffmpeg_budget = FFmpegProcessBudget(
+    FFMPEG_MAX_PROCESSES, max_background_processes=FFMPEG_MAX_BACKGROUND_PROCESSES
+)
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import math
+import os
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+from bot_app.ffmpeg_budget import FFmpegPriority, ffmpeg_budget
+from bot_app.logging_setup import get_logger
+from bot_app.mixing import MAX_GAIN
+from bot_app.sfx_cache import SFX_FILE_EXTENSIONS, file_fingerprint
+
+
+logger = get_logger(__name__)
+
+LOUDNESS_INDEX_VERSION = 1
+LOUDNESS_ANALYSIS_TIMEOUT_SECONDS = 300
+LOUDNESS_HASH_CHUNK_BYTES = 1024 * 1024
+# A normalizalt jel csucsa ennyi dBFS fole nem mehet.
+LOUDNESS_PEAK_CEILING_DBFS = -1.0
+MIN_NORMALIZATION_GAIN = 0.1
+
+_INTEGRATED_LOUDNESS_REGEX = re.compile(r"I:\s*(-?\d+(?:\.\d+)?)\s*LUFS")
+_PEAK_REGEX = re.compile(r"Peak:\s*(-?\d+(?:\.\d+)?|-inf)\s*dBFS")
+
+
+def _last_float(regex: re.Pattern, text: str) -> Optional[float]:
+    matches = regex.findall(text)
+    if not matches:
+        return None
+    try:
+        return float(matches[-1])
+    except ValueError:
+        return None
+
+
+def parse_ebur128_report(stderr_text: str) -> dict:
+    return {
+        "integrated_loudness": _last_float(_INTEGRATED_LOUDNESS_REGEX, stderr_text),
+        "peak": _last_float(_PEAK_REGEX, stderr_text),
+    }
+
+
+def content_hash(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as source_file:
+        while True:
+            chunk = source_file.read(LOUDNESS_HASH_CHUNK_BYTES)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def analyze_loudness(path: str) -> dict:
+    args = [
+        "ffmpeg",
+        "-nostdin",
+        "-hide_banner",
+        "-nostats",
+        "-loglevel",
+        "info",
+        "-i",
+        path,
+        "-vn",
+        "-af",
+        "ebur128=peak=true",
+        "-f",
+        "null",
+        "-",
+    ]
+    with ffmpeg_budget.acquire(FFmpegPriority.BACKGROUND, os.path.basename(path), timeout=None):
+        result = subprocess.run(
+            args,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            timeout=LOUDNESS_ANALYSIS_TIMEOUT_SECONDS,
+            check=False,
+        )
+    stderr_text = result.stderr.decode("utf-8", errors="replace")
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg loudness analysis failed for {path}: {stderr_text.strip()[-300:]}")
+    report = parse_ebur128_report(stderr_text)
+    if report["integrated_loudness"] is None:
+        raise RuntimeError(f"ffmpeg loudness analysis returned no result for {path}")
+    return report
+
+
+def normalization_gain(
+    integrated_loudness: float,
+    peak: Optional[float],
+    *,
+    target_lufs: float,
+    max_gain: float = MAX_GAIN,
+) -> float:
+    gain_db = target_lufs - integrated_loudness
+    if peak is not None and math.isfinite(peak):
+        gain_db = min(gain_db, LOUDNESS_PEAK_CEILING_DBFS - peak)
+    return max(MIN_NORMALIZATION_GAIN, min(max_gain, 10 ** (gain_db / 20)))
+
+
+class LoudnessIndex:
+    def __init__(self, index_path: str, *, target_lufs: float, max_gain: float = MAX_GAIN):
+        self.index_path = index_path
+        self.target_lufs = target_lufs
+        self.max_gain = max_gain
+        self._lock = threading.Lock()
+        self._pending: set[str] = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="loudness-analysis")
+        # tracks: tartalom hash -> meres; paths: fajl -> (mtime, meret, hash), hogy ne kelljen ujra hash-elni.
+        self._tracks, self._paths = self._load_index()
+
+    def _load_index(self) -> tuple[dict[str, dict], dict[str, dict]]:
+        if not os.path.exists(self.index_path):
+            return {}, {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                data = json.load(index_file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Failed to load loudness index: %s", e)
+            return {}, {}
+        if not isinstance(data, dict) or data.get("version") != LOUDNESS_INDEX_VERSION:
+            return {}, {}
+        tracks = data.get("tracks") if isinstance(data.get("tracks"), dict) else {}
+        paths = data.get("paths") if isinstance(data.get("paths"), dict) else {}
+        return (
+            {str(key): value for key, value in tracks.items() if isinstance(value, dict)},
+            {str(key): value for key, value in paths.items() if isinstance(value, dict)},
+        )
+
+    def _save_index_locked(self) -> None:
+        # Az eltunt (pl. lejatszas utan torolt) fajlok path bejegyzeseit eldobjuk, a hash meres marad.
+        self._paths = {path: entry for path, entry in self._paths.items() if os.path.exists(path)}
+        payload = {"version": LOUDNESS_INDEX_VERSION, "tracks": self._tracks, "paths": self._paths}
+        temp_path = f"{self.index_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as index_file:
+                json.dump(payload, index_file, indent=2, ensure_ascii=False)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            logger.warning("Failed to save loudness index: %s", e)
+
+    def _known_hash(self, path: str, fingerprint: tuple[int, int]) -> Optional[str]:
+        with self._lock:
+            entry = self._paths.get(path)
+        if entry and (entry.get("mtime_ns"), entry.get("size")) == fingerprint:
+            return entry.get("hash")
+        return None
+
+    def _gain_for_hash(self, digest: Optional[str]) -> Optional[float]:
+        if not digest:
+            return None
+        with self._lock:
+            track = self._tracks.get(digest)
+        if not track:
+            return None
+        return normalization_gain(
+            track["integrated_loudness"],
+            track.get("peak"),
+            target_lufs=self.target_lufs,
+            max_gain=self.max_gain,
+        )
+
+    def cached_gain(self, path: str) -> Optional[float]:
+        path = os.path.abspath(path)
+        fingerprint = file_fingerprint(path)
+        if fingerprint is None:
+            return None
+        gain = self._gain_for_hash(self._known_hash(path, fingerprint))
+        if gain is None:
+            self.schedule(path)
+        return gain
+
+    def resolve_gain(self, path: str) -> Optional[float]:
+        # Blokkolo: ismeretlen fajlnal hash-el, igy egy ujra letoltott szam is megtalalja a mereset.
+        path = os.path.abspath(path)
+        fingerprint = file_fingerprint(path)
+        if fingerprint is None:
+            return None
+        digest = self._known_hash(path, fingerprint)
+        if digest is None:
+            try:
+                digest = content_hash(path)
+            except OSError as e:
+                logger.warning("Loudness hash failed (%s): %s", path, e)
+                return None
+            with self._lock:
+                self._paths[path] = {"mtime_ns": fingerprint[0], "size": fingerprint[1], "hash": digest}
+        gain = self._gain_for_hash(digest)
+        if gain is None:
+            self.schedule(path)
+        return gain
+
+    def analyze(self, path: str) -> Optional[dict]:
+        path = os.path.abspath(path)
+        fingerprint = file_fingerprint(path)
+        if fingerprint is None:
+            return None
+        digest = self._known_hash(path, fingerprint) or content_hash(path)
+        with self._lock:
+            track = self._tracks.get(digest)
+        if track is None:
+            started_at = time.monotonic()
+            track = {**analyze_loudness(path), "analyzed_at": int(time.time())}
+            logger.info(
+                "Loudness analyzed. file=%s loudness=%s peak=%s took=%.1fs",
+                path,
+                track["integrated_loudness"],
+                track["peak"],
+                time.monotonic() - started_at,
+            )
+        with self._lock:
+            self._tracks[digest] = track
+            self._paths[path] = {"mtime_ns": fingerprint[0], "size": fingerprint[1], "hash": digest}
+            self._save_index_locked()
+        return {
+            **track,
+            "hash": digest,
+            "gain": normalization_gain(
+                track["integrated_loudness"],
+                track.get("peak"),
+                target_lufs=self.target_lufs,
+                max_gain=self.max_gain,
+            ),
+        }
+
+    def schedule(self, path: str) -> None:
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self._pending:
+                return
+            self._pending.add(path)
+        self._executor.submit(self._analyze_pending, path)
+
+    def _analyze_pending(self, path: str) -> None:
+        try:
+            self.analyze(path)
+        except Exception as e:
+            logger.warning("Loudness analysis failed (%s): %s", path, e)
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+
+    def scan(self, folder: str, extensions: Iterable[str] = SFX_FILE_EXTENSIONS) -> None:
+        if not os.path.isdir(folder):
+            return
+        extensions = tuple(extensions)
+        for filename in sorted(os.listdir(folder)):
+            if filename.lower().endswith(extensions):
+                self.cached_gain(os.path.join(folder, filename))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"tracks": len(self._tracks), "paths": len(self._paths), "pending": len(self._pending)}
@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+import time
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from bot_app.logging_setup import get_logger
+from bot_app.track_cache import TRACK_CACHE_INFO_FIELDS
+
+
+logger = get_logger(__name__)
+
+METADATA_CACHE_VERSION = 1
+# A cache-bol adott stream URL-nek a szam vegeig plusz ennyi ideig meg ervenyesnek kell lennie.
+STREAM_URL_SAFETY_SECONDS = 300
+# A cache-bol jott info csak reszhalmaz (nincsenek formatumok); letolteshez ujra ki kell nyerni.
+METADATA_CACHED_FIELD = "_metadata_cached"
+
+
+def normalize_search_query(query: str) -> str:
+    return " ".join(str(query or "").lower().split())
+
+
+def info_subset(info: Optional[dict]) -> dict:
+    # A stream URL-ek par ora alatt lejarnak, ezert csak a stabil mezoket taroljuk.
+    info = info or {}
+    return {field: info.get(field) for field in TRACK_CACHE_INFO_FIELDS if info.get(field) is not None}
+
+
+def stream_url_expiry(url: str) -> Optional[float]:
+    # A YouTube (googlevideo) stream URL-ek az expire parameterben hordozzak a lejaratukat.
+    try:
+        values = parse_qs(urlparse(url).query).get("expire")
+        return float(values[0]) if values else None
+    except (TypeError, ValueError):
+        return None
+
+
+class YTDLMetadataCache:
+    def __init__(
+        self,
+        path: str,
+        *,
+        search_ttl_seconds: int,
+        info_ttl_seconds: int,
+        stream_ttl_seconds: int,
+        max_entries: int,
+    ):
+        self.path = path
+        self.search_ttl_seconds = search_ttl_seconds
+        self.info_ttl_seconds = info_ttl_seconds
+        self.stream_ttl_seconds = stream_ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # searches: normalizalt kereses -> jeloltek; infos: URL -> info reszhalmaz (+ meg ervenyes stream URL).
+        self._searches, self._infos = self._load()
+
+    def _load(self) -> tuple[dict[str, dict], dict[str, dict]]:
+        if not os.path.exists(self.path):
+            return {}, {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as cache_file:
+                data = json.load(cache_file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Failed to load yt-dlp metadata cache: %s", e)
+            return {}, {}
+        if not isinstance(data, dict) or data.get("version") != METADATA_CACHE_VERSION:
+            return {}, {}
+        searches = data.get("searches") if isinstance(data.get("searches"), dict) else {}
+        infos = data.get("infos") if isinstance(data.get("infos"), dict) else {}
+        return (
+            {str(key): value for key, value in searches.items() if isinstance(value, dict)},
+            {str(key): value for key, value in infos.items() if isinstance(value, dict)},
+        )
+
+    def _save_locked(self) -> None:
+        now = time.time()
+        self._prune_locked(self._searches, self.search_ttl_seconds, now)
+        self._prune_locked(self._infos, self.info_ttl_seconds, now)
+        payload = {"version": METADATA_CACHE_VERSION, "searches": self._searches, "infos": self._infos}
+        temp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as cache_file:
+                json.dump(payload, cache_file, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning("Failed to save yt-dlp metadata cache: %s", e)
+
+    def _prune_locked(self, entries: dict[str, dict], ttl_seconds: int, now: float) -> None:
+        for key in [key for key, entry in entries.items() if now - entry.get("stored_at", 0) > ttl_seconds]:
+            del entries[key]
+        overflow = len(entries) - self.max_entries
+        if overflow > 0:
+            for key in sorted(entries, key=lambda key: entries[key].get("last_used", 0))[:overflow]:
+                del entries[key]
+
+    def _get_locked(self, entries: dict[str, dict], key: str, ttl_seconds: int) -> Optional[dict]:
+        entry = entries.get(key)
+        now = time.time()
+        if entry is not None and now - entry.get("stored_at", 0) > ttl_seconds:
+            del entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry["last_used"] = now
+        return entry
+
+    def get_search(self, query: str, limit: int) -> Optional[list[dict]]:
+        key = normalize_search_query(query)
+        with self._lock:
+            if self._searches.get(key, {}).get("limit", 0) < limit:
+                # Kevesebb jeloltre keresett bejegyzes nem eleg, ujra kell keresni.
+                self.misses += 1
+                return None
+            entry = self._get_locked(self._searches, key, self.search_ttl_seconds)
+            if entry is None:
+                return None
+            return [dict(candidate) for candidate in entry.get("candidates", [])[:limit]]
+
+    def _info_entry(self, info: dict, now: float) -> dict:
+        entry = {"info": info_subset(info), "stored_at": now, "last_used": now}
+        stream_url = info.get("url")
+        if stream_url and not info.get("is_live") and self.stream_ttl_seconds:
+            expires_at = now + self.stream_ttl_seconds
+            url_expiry = stream_url_expiry(stream_url)
+            if url_expiry is not None:
+                expires_at = min(expires_at, url_expiry)
+            entry["stream"] = {
+                "url": stream_url,
+                "http_headers": info.get("http_headers"),
+                "expires_at": expires_at,
+            }
+        return entry
+
+    def put_search(self, query: str, limit: int, candidates: list[dict]) -> None:
+        # A jeloltek teljes info dictek; a stream URL-jukkel a jelolt feloldasa kinyeres nelkul megy.
+        now = time.time()
+        with self._lock:
+            self._searches[normalize_search_query(query)] = {
+                "limit": limit,
+                "candidates": [info_subset(candidate) for candidate in candidates],
+                "stored_at": now,
+                "last_used": now,
+            }
+            for candidate in candidates:
+                url = candidate.get("webpage_url")
+                if url:
+                    self._infos[url] = self._info_entry(candidate, now)
+            self._save_locked()
+
+    def get_info(self, url: str) -> Optional[dict]:
+        # Info reszhalmaz; ha a tarolt stream URL a szam vegeig meg ervenyes, a "url" mezovel egyutt.
+        with self._lock:
+            entry = self._get_locked(self._infos, url, self.info_ttl_seconds)
+            if entry is None:
+                return None
+            info = {**entry["info"], METADATA_CACHED_FIELD: True}
+            stream = entry.get("stream")
+            if stream:
+                playback_seconds = float(info.get("duration") or 0) + STREAM_URL_SAFETY_SECONDS
+                if time.time() + playback_seconds < stream.get("expires_at", 0):
+                    info["url"] = stream["url"]
+                    if stream.get("http_headers"):
+                        info["http_headers"] = dict(stream["http_headers"])
+                else:
+                    del entry["stream"]
+            return info
+
+    def put_info(self, url: str, info: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._infos[url] = self._info_entry(info, now)
+            self._save_locked()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "searches": len(self._searches),
+                "infos": len(self._infos),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
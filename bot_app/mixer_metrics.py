@@ -0,0 +1,89 @@
+import time
+
+from bot_app.mixing import FRAME_DURATION_MS
+
+
+READ_TIME_BUCKETS_MS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, float(FRAME_DURATION_MS))
+
+
+class SourceTiming:
+    __slots__ = ("frames", "total_seconds", "max_seconds")
+
+    def __init__(self):
+        self.frames = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, duration: float) -> None:
+        self.frames += 1
+        self.total_seconds += duration
+        if duration > self.max_seconds:
+            self.max_seconds = duration
+
+    def snapshot(self) -> dict:
+        average_ms = self.total_seconds * 1000 / self.frames if self.frames else 0.0
+        return {
+            "frames": self.frames,
+            "avg_ms": round(average_ms, 4),
+            "max_ms": round(self.max_seconds * 1000, 4),
+        }
+
+
+class MixerMetrics:
+    def __init__(self):
+        self.started_at = time.time()
+        self.frames = 0
+        self.silence_frames = 0
+        self.opus_frames = 0
+        self.finished_underruns = 0
+        self.active_overlays = 0
+        self.max_overlays = 0
+        self.read_time = SourceTiming()
+        self.read_time_buckets = [0] * (len(READ_TIME_BUCKETS_MS) + 1)
+        self.source_timings: dict[tuple[str, str], SourceTiming] = {}
+
+    def record_source(self, role: str, name: str, duration: float) -> None:
+        key = (role, name)
+        timing = self.source_timings.get(key)
+        if timing is None:
+            timing = self.source_timings[key] = SourceTiming()
+        timing.record(duration)
+
+    def record_frame(self, duration: float, *, silence: bool, opus: bool, overlays: int) -> None:
+        self.frames += 1
+        if silence:
+            self.silence_frames += 1
+        if opus:
+            self.opus_frames += 1
+        self.active_overlays = overlays
+        if overlays > self.max_overlays:
+            self.max_overlays = overlays
+        self.read_time.record(duration)
+        duration_ms = duration * 1000
+        for index, upper_bound in enumerate(READ_TIME_BUCKETS_MS):
+            if duration_ms <= upper_bound:
+                self.read_time_buckets[index] += 1
+                return
+        self.read_time_buckets[-1] += 1
+
+    def snapshot(self, *, live_underruns: int = 0) -> dict:
+        histogram = {
+            f"le_{upper_bound:g}ms": count
+            for upper_bound, count in zip(READ_TIME_BUCKETS_MS, self.read_time_buckets)
+        }
+        histogram[f"gt_{READ_TIME_BUCKETS_MS[-1]:g}ms"] = self.read_time_buckets[-1]
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "frames": self.frames,
+            "silence_frames": self.silence_frames,
+            "opus_passthrough_frames": self.opus_frames,
+            "underruns": self.finished_underruns + live_underruns,
+            "active_overlays": self.active_overlays,
+            "max_overlays": self.max_overlays,
+            "read_time": self.read_time.snapshot(),
+            "read_time_histogram": histogram,
+            "sources": {
+                f"{role}:{name}": timing.snapshot()
+                for (role, name), timing in sorted(self.source_timings.items())
+            },
+        }
@@ -0,0 +1,234 @@
+import math
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+FRAME_DURATION_MS = 20
+FRAME_SAMPLES_PER_CHANNEL = SAMPLE_RATE * FRAME_DURATION_MS // 1000
+FRAME_SAMPLES = FRAME_SAMPLES_PER_CHANNEL * CHANNELS
+FRAME_SIZE = FRAME_SAMPLES * SAMPLE_WIDTH
+
+# Q12 fixpontos erosites: 4096 = 1.0x, igy minden az int32 akkumulatorban marad.
+GAIN_SHIFT = 12
+UNITY_GAIN = 1 << GAIN_SHIFT
+MAX_GAIN = 2.0
+INT16_MIN = -32768
+INT16_MAX = 32767
+
+
+def gain_to_fixed(gain: float) -> int:
+    gain = max(0.0, min(MAX_GAIN, float(gain)))
+    return int(round(gain * UNITY_GAIN))
+
+
+class DuckingEnvelope:
+    # Egypolusu simitas mintankent, de frame-enkent egyetlen vektoros muvelettel:
+    # g[n] = cel + (g0 - cel) * a^n, ahol az a^n gorbe elore ki van szamolva.
+    def __init__(self, *, depth: float, attack_ms: int, release_ms: int):
+        self.depth = max(0.0, min(1.0, depth))
+        self.gain = 1.0
+        self._attack_curve = self._decay_curve(attack_ms)
+        self._release_curve = self._decay_curve(release_ms)
+        self._envelope = np.empty(FRAME_SAMPLES_PER_CHANNEL, dtype=np.float32)
+
+    @staticmethod
+    def _decay_curve(time_constant_ms: int) -> np.ndarray:
+        if time_constant_ms <= 0:
+            return np.zeros(FRAME_SAMPLES_PER_CHANNEL, dtype=np.float32)
+        coefficient = np.exp(-1000.0 / (time_constant_ms * SAMPLE_RATE))
+        steps = np.arange(1, FRAME_SAMPLES_PER_CHANNEL + 1, dtype=np.float64)
+        return (coefficient ** steps).astype(np.float32)
+
+    @property
+    def enabled(self) -> bool:
+        return self.depth < 1.0
+
+    @property
+    def settled(self) -> bool:
+        return self.gain == 1.0
+
+    def advance(self, active: bool) -> Optional[np.ndarray]:
+        target = self.depth if active else 1.0
+        if abs(self.gain - target) < 1e-3:
+            self.gain = target
+            return None
+        curve = self._attack_curve if target < self.gain else self._release_curve
+        np.multiply(curve, self.gain - target, out=self._envelope)
+        np.add(self._envelope, target, out=self._envelope)
+        self.gain = float(self._envelope[-1])
+        return self._envelope
+
+
+class LookaheadLimiter:
+    # Minden frame egyetlen vektoros menetben: csucs -> szukseges erosites, csuszo minimum
+    # a look-ahead ablakra, mozgo atlag a sima attackhoz, linearis release a minimum.accumulate-tel.
+    # A kimenet a look-ahead hosszaval (par ms) kesik, igy a csucs elott mar lent van az erosites.
+    def __init__(self, *, threshold_db: float = -1.0, lookahead_ms: int = 2, release_ms: int = 80):
+        self.threshold = INT16_MAX * 10 ** (min(0.0, threshold_db) / 20)
+        self.lookahead = max(1, SAMPLE_RATE * lookahead_ms // 1000)
+        if 2 * self.lookahead > FRAME_SAMPLES_PER_CHANNEL:
+            raise ValueError("A limiter look-ahead nem lehet hosszabb fel frame-nel.")
+        self._release_step = 1.0 / max(1, SAMPLE_RATE * release_ms // 1000)
+        lookahead = self.lookahead
+        frame_samples = FRAME_SAMPLES_PER_CHANNEL
+        # [2L elozmeny | aktualis frame] szukseges erosites es [L elozmeny | aktualis frame] hang.
+        self._required = np.ones(2 * lookahead + frame_samples, dtype=np.float32)
+        self._audio = np.zeros((lookahead + frame_samples, CHANNELS), dtype=np.int32)
+        self._ramp = np.arange(frame_samples, dtype=np.float32) * np.float32(self._release_step)
+        self._scaled = np.zeros((frame_samples, CHANNELS), dtype=np.float32)
+        self._output = np.zeros((frame_samples, CHANNELS), dtype=np.int32)
+        self._last_gain = 1.0
+        self.gain_reduction_db = 0.0
+        self.max_gain_reduction_db = 0.0
+        self.limited_frames = 0
+
+    def reset(self) -> None:
+        self._required.fill(1.0)
+        self._audio.fill(0)
+        self._last_gain = 1.0
+        self.gain_reduction_db = 0.0
+
+    def process(self, accumulator: np.ndarray) -> np.ndarray:
+        lookahead = self.lookahead
+        frame_samples = FRAME_SAMPLES_PER_CHANNEL
+        frame = accumulator.reshape(frame_samples, CHANNELS)
+        self._audio[:lookahead] = self._audio[frame_samples:]
+        self._audio[lookahead:] = frame
+        self._required[:2 * lookahead] = self._required[frame_samples:]
+
+        required = self._required[2 * lookahead:]
+        peaks = np.abs(frame).max(axis=1)
+        if int(peaks.max()) <= self.threshold:
+            required.fill(1.0)
+        else:
+            np.divide(self.threshold, np.maximum(peaks, 1), out=required, casting="unsafe")
+            np.minimum(required, 1.0, out=required)
+
+        if self._last_gain >= 1.0 and float(self._required.min()) >= 1.0:
+            # Nincs mit limitalni: csak a kesleltetett hang megy tovabb.
+            self._output[:] = self._audio[:frame_samples]
+            self.gain_reduction_db = 0.0
+            return self._output
+
+        window_min = sliding_window_view(self._required, lookahead + 1).min(axis=1)
+        window_sums = np.concatenate(([0.0], np.cumsum(window_min, dtype=np.float64)))
+        smoothed = (
+            (window_sums[lookahead + 1:] - window_sums[:frame_samples]) / (lookahead + 1)
+        ).astype(np.float32)
+        # g[n] = min(smoothed[n], g[n-1] + lepes) zart alakban.
+        np.subtract(smoothed, self._ramp, out=smoothed)
+        np.minimum.accumulate(smoothed, out=smoothed)
+        np.minimum(smoothed, self._last_gain + self._release_step, out=smoothed)
+        np.add(smoothed, self._ramp, out=smoothed)
+        np.minimum(smoothed, 1.0, out=smoothed)
+        self._last_gain = float(smoothed[-1])
+
+        np.multiply(self._audio[:frame_samples], smoothed[:, None], out=self._scaled)
+        self._output[:] = self._scaled
+        minimum_gain = float(smoothed.min())
+        self.gain_reduction_db = -20 * math.log10(max(minimum_gain, 1e-6))
+        if self.gain_reduction_db > 0.01:
+            self.limited_frames += 1
+            self.max_gain_reduction_db = max(self.max_gain_reduction_db, self.gain_reduction_db)
+        return self._output
+
+    def snapshot(self) -> dict:
+        return {
+            "threshold_dbfs": round(20 * math.log10(self.threshold / INT16_MAX), 2),
+            "lookahead_ms": round(self.lookahead * 1000 / SAMPLE_RATE, 2),
+            "gain_reduction_db": round(self.gain_reduction_db, 2),
+            "max_gain_reduction_db": round(self.max_gain_reduction_db, 2),
+            "limited_frames": self.limited_frames,
+        }
+
+
+class PCMFrameMixer:
+    def __init__(self, limiter: Optional[LookaheadLimiter] = None):
+        self.limiter = limiter
+        self._accumulator = np.zeros(FRAME_SAMPLES, dtype=np.int32)
+        self._scratch = np.zeros(FRAME_SAMPLES, dtype=np.int32)
+        self._envelope_scaled = np.zeros(FRAME_SAMPLES_PER_CHANNEL, dtype=np.float32)
+        self._envelope_fixed = np.zeros(FRAME_SAMPLES_PER_CHANNEL, dtype=np.int32)
+        self._output = np.zeros(FRAME_SAMPLES, dtype=np.int16)
+        self._layer_count = 0
+        self._single_layer: Optional[bytes] = None
+
+    def begin(self) -> None:
+        self._accumulator.fill(0)
+        self._layer_count = 0
+        self._single_layer = None
+
+    @property
+    def layer_count(self) -> int:
+        return self._layer_count
+
+    def add(self, data: bytes, gain: float = 1.0) -> None:
+        sample_count = min(len(data), FRAME_SIZE) // SAMPLE_WIDTH
+        if sample_count <= 0:
+            return
+        gain_fixed = gain_to_fixed(gain)
+        if gain_fixed <= 0:
+            return
+
+        samples = np.frombuffer(data, dtype=np.int16, count=sample_count)
+        target = self._accumulator[:sample_count]
+        if gain_fixed == UNITY_GAIN:
+            np.add(target, samples, out=target)
+            self._single_layer = data if self._layer_count == 0 else None
+        else:
+            scratch = self._scratch[:sample_count]
+            np.multiply(samples, gain_fixed, out=scratch, dtype=np.int32)
+            np.right_shift(scratch, GAIN_SHIFT, out=scratch)
+            np.add(target, scratch, out=target)
+            self._single_layer = None
+        self._layer_count += 1
+
+    def add_enveloped(self, data: bytes, gain: float, envelope: np.ndarray) -> None:
+        frame_count = min(len(data), FRAME_SIZE) // (SAMPLE_WIDTH * CHANNELS)
+        if frame_count <= 0:
+            return
+        sample_count = frame_count * CHANNELS
+        envelope_fixed = self._envelope_fixed[:frame_count]
+        np.multiply(
+            envelope[:frame_count],
+            gain_to_fixed(gain),
+            out=self._envelope_scaled[:frame_count],
+        )
+        envelope_fixed[:] = self._envelope_scaled[:frame_count]
+
+        samples = np.frombuffer(data, dtype=np.int16, count=sample_count).reshape(frame_count, CHANNELS)
+        scratch = self._scratch[:sample_count].reshape(frame_count, CHANNELS)
+        np.multiply(samples, envelope_fixed[:, None], out=scratch, dtype=np.int32)
+        np.right_shift(scratch, GAIN_SHIFT, out=scratch)
+        target = self._accumulator[:sample_count]
+        np.add(target, self._scratch[:sample_count], out=target)
+        self._single_layer = None
+        self._layer_count += 1
+
+    def reset_limiter(self) -> None:
+        # Ha egy frame nem ezen az uton ment ki (csend, Opus passthrough), a kesleltetett maradek mar elavult.
+        if self.limiter is not None:
+            self.limiter.reset()
+
+    def render(self) -> bytes:
+        if self.limiter is not None:
+            limited = self.limiter.process(self._accumulator)
+            np.clip(limited, INT16_MIN, INT16_MAX, out=limited)
+            self._output.reshape(FRAME_SAMPLES_PER_CHANNEL, CHANNELS)[:] = limited
+            return self._output.tobytes()
+        # Egyetlen, erosites nelkuli, teljes frame: nincs mit keverni, az eredeti bajtok mennek tovabb.
+        if (
+            self._layer_count == 1
+            and self._single_layer is not None
+            and len(self._single_layer) == FRAME_SIZE
+        ):
+            return self._single_layer
+        np.clip(self._accumulator, INT16_MIN, INT16_MAX, out=self._accumulator)
+        self._output[:] = self._accumulator
+        # A discord.py Opus encodere ctypes-szal castol, ezert immutable bytes kell neki.
+        return self._output.tobytes()
@@ -5,10 +5,11 @@ import discord
 import os
 from gtts import gTTS
 from bot_app.core import (
-    bot, logger, get_mixer, play_next_in_queue, song_queues, 
-    titles_queues, YTDLSource, get_play_lock, ensure_queue,
-    find_local_music, LocalFileSource, sp, ytdl, cleanup_audio_source,
-    get_voice_operation_lock, BASE_DIR, TARGET_CHANNEL_ID,
+    bot, logger, get_mixer, play_next_in_queue, stage_next_in_queue,
+    DuplicateTrack, TrackQueueFull, ensure_queue, search_track_candidates,
+    race_playable_tracks,
+    find_local_music, LocalTrack, build_tts_source, spotify_resolver,
+    get_voice_operation_lock, is_user_paused, BASE_DIR, TARGET_CHANNEL_ID,
     normalize_voice_runtime_error, settle_voice_connection
 )
 
@@ -192,9 +193,7 @@ class DiscordMQTTBridge:
             tts = gTTS(text=text, lang="hu")
             tts.save(tts_file)
             mixer = get_mixer(voice_client)
-            mixer.set_main_source(discord.FFmpegPCMAudio(tts_file, options="-vn"))
-            while mixer.has_main_source():
-                await asyncio.sleep(0.5)
+            await mixer.set_main_source(build_tts_source(tts_file))
         finally:
             if os.path.exists(tts_file): os.remove(tts_file)
 
@@ -251,37 +250,41 @@ class DiscordMQTTBridge:
             query,
         )
         ensure_queue(guild.id)
-        player = None
+        queued_track = None
         local_filename = find_local_music(query)
         if local_filename:
-            source = discord.FFmpegPCMAudio(f"music/{local_filename}", options="-vn")
-            player = LocalFileSource(source, title=local_filename)
-        if not player:
+            queued_track = LocalTrack(local_filename)
+        if not queued_track:
             search_query = query
             if "spotify.com" in query:
                 try:
-                    track = sp.track(query)
-                    search_query = f"ytsearch:{track['artists'][0]['name']} - {track['name']}"
+                    search_query = f"ytsearch:{await spotify_resolver.resolve(query)}"
                 except: pass
             elif not query.startswith("http"):
                 search_query = f"ytsearch:{query}"
-            try:
-                player = await YTDLSource.from_url(search_query, loop=bot.loop, stream=False)
-            except:
-                try: player = await YTDLSource.from_url(search_query, loop=bot.loop, stream=True)
-                except: return
-        if player:
+            queued_track, _, errors = await race_playable_tracks(
+                await search_track_candidates(search_query, guild_id=guild.id), guild_id=guild.id
+            )
+            if queued_track is None:
+                logger.warning("MQTT play found no playable source. guild=%s query=%s errors=%s", guild.id, query, errors[-1:])
+                return
+        if queued_track:
             mixer = get_mixer(voice_client)
-            if mixer.main_source or voice_client.is_paused():
-                song_queues[guild.id].append(player)
-                titles_queues[guild.id].append(player.title)
+            if mixer.main_source or is_user_paused(voice_client):
+                try:
+                    ensure_queue(guild.id).append(queued_track)
+                except (TrackQueueFull, DuplicateTrack) as e:
+                    queued_track.release()
+                    logger.info("MQTT play not queued. guild=%s query=%s reason=%s", guild.id, query, e)
+                    return
+                stage_next_in_queue(guild.id, mixer)
             else:
-                from bot_app.core import play_next_in_queue
                 class FakeCtx:
                     def __init__(self, guild): self.guild = guild
                     async def send(self, msg): logger.info(f"Bot üzenet: {msg}")
                 fake_ctx = FakeCtx(guild)
-                mixer.set_main_source(player, on_end=lambda: asyncio.run_coroutine_threadsafe(play_next_in_queue(fake_ctx), bot.loop))
+                mixer.set_main_source(queued_track.build_source(), on_end=lambda: play_next_in_queue(fake_ctx))
+                queued_track.release()
 
 async def start_mqtt():
     bridge = DiscordMQTTBridge()
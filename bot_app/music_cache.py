@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+from bot_app.ffmpeg_budget import FFmpegPriority, ffmpeg_budget
+from bot_app.logging_setup import get_logger
+from bot_app.loudness import LoudnessIndex
+from bot_app.mixing import CHANNELS, SAMPLE_RATE
+from bot_app.sfx_cache import file_fingerprint
+
+
+logger = get_logger(__name__)
+
+MUSIC_FILE_EXTENSIONS = (".mp3", ".wav", ".m4a")
+MUSIC_TRANSCODE_TIMEOUT_SECONDS = 600
+MUSIC_CACHE_INDEX_FILENAME = "index.json"
+OPUS_CACHE_BITRATE = "128k"
+
+_DURATION_REGEX = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+def parse_transcode_duration(stderr_text: str) -> Optional[float]:
+    duration_match = _DURATION_REGEX.search(stderr_text)
+    if not duration_match:
+        return None
+    hours, minutes, seconds = duration_match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+class OpusLibraryCache:
+    def __init__(self, cache_dir: str, *, gain: float = 1.0, loudness: Optional[LoudnessIndex] = None):
+        self.cache_dir = cache_dir
+        self.gain = gain
+        self.loudness = loudness
+        self.index_path = os.path.join(cache_dir, MUSIC_CACHE_INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._pending: set[str] = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="music-transcode")
+        self._entries = self._load_index()
+
+    def _load_index(self) -> dict[str, dict]:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                data = json.load(index_file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Failed to load music cache index: %s", e)
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        return {str(key): value for key, value in data.items() if isinstance(value, dict)}
+
+    def _save_index_locked(self) -> None:
+        temp_path = f"{self.index_path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as index_file:
+                json.dump(self._entries, index_file, indent=2, ensure_ascii=False)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            logger.warning("Failed to save music cache index: %s", e)
+
+    def _cache_key(self, source_path: str, fingerprint: tuple[int, int]) -> str:
+        raw_key = f"{os.path.abspath(source_path)}|{fingerprint[0]}|{fingerprint[1]}|{self.gain:.4f}"
+        if self.loudness is not None:
+            # "level2": a normalizalo erosites es a MUSIC_VOLUME_PERCENT szorzata van beegetve.
+            raw_key = f"{raw_key}|{self.loudness.target_lufs:g}LUFS|level2"
+        return hashlib.sha1(raw_key.encode("utf-8")).hexdigest()
+
+    def lookup(self, source_path: str) -> Optional[dict]:
+        fingerprint = file_fingerprint(source_path)
+        if fingerprint is None:
+            return None
+        key = self._cache_key(source_path, fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+        if not entry or not os.path.exists(entry.get("cache_path", "")):
+            return None
+        return dict(entry)
+
+    def schedule(self, source_path: str) -> None:
+        source_path = os.path.abspath(source_path)
+        with self._lock:
+            if source_path in self._pending:
+                return
+            self._pending.add(source_path)
+        self._executor.submit(self._transcode_pending, source_path)
+
+    def scan(self, folder: str, extensions: Iterable[str] = MUSIC_FILE_EXTENSIONS) -> None:
+        if not os.path.isdir(folder):
+            return
+        extensions = tuple(extensions)
+        for filename in sorted(os.listdir(folder)):
+            if not filename.endswith(extensions):
+                continue
+            file_path = os.path.join(folder, filename)
+            if self.lookup(file_path) is None:
+                self.schedule(file_path)
+
+    def _transcode_pending(self, source_path: str) -> None:
+        try:
+            self.transcode(source_path)
+        except Exception:
+            logger.exception("Music cache transcode failed: %s", source_path)
+        finally:
+            with self._lock:
+                self._pending.discard(source_path)
+
+    def encode(self, source_path: str, target_path: str) -> Optional[dict]:
+        # Blokkolo: a forrast a zenei hangero-szabaly szerinti erositessel Ogg/Opus-ba kodolja.
+        # A normalizalo erosites a hangossag indexbol jon, a MUSIC_VOLUME_PERCENT (self.gain) erre szorzodik,
+        # es mindketto bele van egetve a fajlba, igy az 1.0-s hangerovel, Opus passthrough-val jatszhato.
+        loudness = None
+        gain = self.gain
+        if self.loudness is not None:
+            try:
+                loudness = self.loudness.analyze(source_path)
+            except (OSError, subprocess.SubprocessError, RuntimeError) as e:
+                logger.warning("Music cache loudness analysis failed (%s): %s", source_path, e)
+            if loudness:
+                gain = loudness["gain"] * self.gain
+        temp_path = f"{target_path}.tmp"
+        args = [
+            "ffmpeg",
+            "-nostdin",
+            "-hide_banner",
+            "-nostats",
+            "-loglevel",
+            "info",
+            "-y",
+            "-i",
+            source_path,
+            "-vn",
+            *(["-af", f"volume={gain:.4f}"] if abs(gain - 1.0) > 1e-3 else []),
+            "-c:a",
+            "libopus",
+            "-b:a",
+            OPUS_CACHE_BITRATE,
+            "-ar",
+            str(SAMPLE_RATE),
+            "-ac",
+            str(CHANNELS),
+            "-f",
+            "ogg",
+            temp_path,
+        ]
+        try:
+            with ffmpeg_budget.acquire(
+                FFmpegPriority.BACKGROUND, os.path.basename(source_path), timeout=None
+            ):
+                result = subprocess.run(
+                    args,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE,
+                    timeout=MUSIC_TRANSCODE_TIMEOUT_SECONDS,
+                    check=False,
+                )
+        except subprocess.TimeoutExpired:
+            logger.warning("Music cache transcode timed out: %s", source_path)
+            self._remove_file(temp_path)
+            return None
+
+        stderr_text = result.stderr.decode("utf-8", errors="replace")
+        if result.returncode != 0:
+            logger.warning(
+                "Music cache transcode failed (%s): %s",
+                source_path,
+                stderr_text.strip()[-300:],
+            )
+            self._remove_file(temp_path)
+            return None
+
+        os.replace(temp_path, target_path)
+        return {
+            "gain": gain,
+            "music_volume": self.gain,
+            "duration": parse_transcode_duration(stderr_text),
+            "integrated_loudness": loudness["integrated_loudness"] if loudness else None,
+            "peak": loudness["peak"] if loudness else None,
+        }
+
+    def transcode(self, source_path: str) -> Optional[dict]:
+        cached = self.lookup(source_path)
+        if cached:
+            return cached
+        fingerprint = file_fingerprint(source_path)
+        if fingerprint is None:
+            return None
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        key = self._cache_key(source_path, fingerprint)
+        cache_path = os.path.join(self.cache_dir, f"{key}.opus")
+        started_at = time.monotonic()
+        encoded = self.encode(source_path, cache_path)
+        if encoded is None:
+            return None
+
+        entry = {
+            "source_path": os.path.abspath(source_path),
+            "cache_path": cache_path,
+            "mtime_ns": fingerprint[0],
+            "size": fingerprint[1],
+            "gain": encoded["gain"],
+            "created_at": int(time.time()),
+            "duration": encoded["duration"],
+            "integrated_loudness": encoded["integrated_loudness"],
+            "peak": encoded["peak"],
+        }
+        with self._lock:
+            stale_keys = [
+                stale_key
+                for stale_key, stale_entry in self._entries.items()
+                if stale_entry.get("source_path") == entry["source_path"] and stale_key != key
+            ]
+            stale_paths = [self._entries.pop(stale_key).get("cache_path") for stale_key in stale_keys]
+            self._entries[key] = entry
+            self._save_index_locked()
+        for stale_path in stale_paths:
+            if stale_path:
+                self._remove_file(stale_path)
+
+        logger.info(
+            "Music cache transcoded. source=%s duration=%s loudness=%s peak=%s took=%.1fs",
+            source_path,
+            entry["duration"],
+            entry["integrated_loudness"],
+            entry["peak"],
+            time.monotonic() - started_at,
+        )
+        return dict(entry)
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.warning("Music cache cleanup failed (%s): %s", path, e)
@@ -0,0 +1,199 @@
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+import discord
+
+from bot_app.ffmpeg_budget import FFmpegPriority, ffmpeg_budget
+from bot_app.logging_setup import get_logger
+from bot_app.mixing import CHANNELS, FRAME_SIZE, SAMPLE_RATE, SAMPLE_WIDTH
+
+
+logger = get_logger(__name__)
+
+SFX_DECODE_TIMEOUT_SECONDS = 30
+SFX_FILE_EXTENSIONS = (".mp3", ".wav", ".ogg", ".m4a")
+
+
+def pcm_bytes_for_seconds(seconds: float) -> int:
+    return int(seconds * SAMPLE_RATE) * CHANNELS * SAMPLE_WIDTH
+
+
+def decode_to_pcm(path: str, *, max_bytes: Optional[int] = None) -> bytes:
+    args = [
+        "ffmpeg",
+        "-nostdin",
+        "-loglevel",
+        "error",
+        "-i",
+        path,
+        "-vn",
+        "-f",
+        "s16le",
+        "-ar",
+        str(SAMPLE_RATE),
+        "-ac",
+        str(CHANNELS),
+    ]
+    if max_bytes:
+        # Egy frame-nyi rahagyas, hogy a tul hosszu klipet fel tudjuk ismerni.
+        args += ["-fs", str(max_bytes + FRAME_SIZE)]
+    args.append("pipe:1")
+    with ffmpeg_budget.acquire(FFmpegPriority.BACKGROUND, os.path.basename(path), timeout=None):
+        result = subprocess.run(
+            args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=SFX_DECODE_TIMEOUT_SECONDS,
+            check=False,
+        )
+    if result.returncode != 0:
+        error_text = result.stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"ffmpeg decode failed for {path}: {error_text[:300]}")
+    return result.stdout
+
+
+def file_fingerprint(path: str) -> Optional[tuple[int, int]]:
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+
+class MemoryPCMAudio(discord.AudioSource):
+    def __init__(self, pcm, *, start: int = 0, loop: bool = False):
+        self._pcm = memoryview(pcm)
+        self._start = max(0, start - start % SAMPLE_WIDTH)
+        self._position = self._start
+        self._loop = loop
+
+    def read(self) -> bytes:
+        pcm = self._pcm
+        total = len(pcm)
+        if self._position >= total:
+            if not self._loop or total <= self._start:
+                return b""
+            self._position = self._start
+        end = min(self._position + FRAME_SIZE, total)
+        chunk = pcm[self._position:end].tobytes()
+        self._position = end
+        if len(chunk) < FRAME_SIZE:
+            chunk += b"\x00" * (FRAME_SIZE - len(chunk))
+        return chunk
+
+    def cleanup(self) -> None:
+        # A nezet eldobasa kell ahhoz, hogy egy lecserelt hangbank mmap-je bezarhato legyen.
+        self._pcm = memoryview(b"")
+        self._position = 0
+        self._loop = False
+
+    def is_opus(self):
+        return False
+
+
+class SfxPCMCache:
+    def __init__(self, *, max_bytes: int, max_clip_bytes: int):
+        self.max_bytes = max(0, max_bytes)
+        self.max_clip_bytes = max(FRAME_SIZE, max_clip_bytes)
+        self._entries: "OrderedDict[str, tuple[tuple[int, int], bytes]]" = OrderedDict()
+        self._current_bytes = 0
+        self._pending: set[str] = set()
+        self._too_long: dict[str, tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sfx-decode")
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.abspath(path)
+
+    def get(self, path: str, *, record_stats: bool = True) -> Optional[bytes]:
+        key = self._key(path)
+        fingerprint = file_fingerprint(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == fingerprint:
+                self._entries.move_to_end(key)
+                if record_stats:
+                    self.hits += 1
+                return entry[1]
+            if record_stats:
+                self.misses += 1
+            return None
+
+    def load(self, path: str) -> Optional[bytes]:
+        cached = self.get(path, record_stats=False)
+        if cached is not None:
+            return cached
+
+        key = self._key(path)
+        fingerprint = file_fingerprint(key)
+        if fingerprint is None or self.max_bytes <= 0:
+            return None
+        with self._lock:
+            if self._too_long.get(key) == fingerprint:
+                return None
+
+        try:
+            pcm = decode_to_pcm(key, max_bytes=self.max_clip_bytes)
+        except (OSError, subprocess.SubprocessError, RuntimeError) as e:
+            logger.warning("SFX decode failed (%s): %s", key, e)
+            return None
+
+        if len(pcm) > min(self.max_clip_bytes, self.max_bytes):
+            with self._lock:
+                self._too_long[key] = fingerprint
+            logger.info("SFX clip too long for cache, streaming instead: %s", key)
+            return None
+
+        self._store(key, fingerprint, pcm)
+        return pcm
+
+    def _store(self, key: str, fingerprint: tuple[int, int], pcm: bytes) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous:
+                self._current_bytes -= len(previous[1])
+            while self._entries and self._current_bytes + len(pcm) > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._current_bytes -= len(evicted)
+            self._entries[key] = (fingerprint, pcm)
+            self._current_bytes += len(pcm)
+
+    def _load_pending(self, key: str) -> None:
+        try:
+            self.load(key)
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def prefetch(self, path: str) -> None:
+        key = self._key(path)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._load_pending, key)
+
+    def warm(self, folders: Iterable[str]) -> None:
+        for folder in folders:
+            if not os.path.isdir(folder):
+                continue
+            for filename in sorted(os.listdir(folder)):
+                if filename.lower().endswith(SFX_FILE_EXTENSIONS):
+                    self.prefetch(os.path.join(folder, filename))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
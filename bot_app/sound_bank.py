@@ -0,0 +1,282 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import subprocess
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from bot_app.logging_setup import get_logger
+from bot_app.mixing import FRAME_SIZE, SAMPLE_WIDTH
+from bot_app.sfx_cache import SFX_FILE_EXTENSIONS, decode_to_pcm, file_fingerprint
+
+
+logger = get_logger(__name__)
+
+SOUND_BANK_MAGIC = b"DBSNDBNK"
+SOUND_BANK_VERSION = 1
+SOUND_BANK_HEADER = struct.Struct("<8sII")
+SOUND_BANK_ALIGNMENT = 4096
+SOUND_BANK_FOLDERS = ("sounds", "jimmy")
+# Kb. -54 dBFS: ez alatt a frame-et csendnek tekintjuk a klip elejen.
+LEADING_SILENCE_THRESHOLD = 64
+
+
+def _align(value: int) -> int:
+    remainder = value % SOUND_BANK_ALIGNMENT
+    if remainder == 0:
+        return value
+    return value + SOUND_BANK_ALIGNMENT - remainder
+
+
+def count_frames(pcm_length: int) -> int:
+    return (pcm_length + FRAME_SIZE - 1) // FRAME_SIZE
+
+
+def count_leading_silence_frames(pcm) -> int:
+    full_frames = len(pcm) // FRAME_SIZE
+    if full_frames == 0:
+        return 0
+    samples = np.frombuffer(pcm, dtype=np.int16, count=full_frames * FRAME_SIZE // SAMPLE_WIDTH)
+    peaks = np.abs(samples.reshape(full_frames, -1).astype(np.int32)).max(axis=1)
+    loud_frames = np.flatnonzero(peaks > LEADING_SILENCE_THRESHOLD)
+    if loud_frames.size == 0:
+        return 0
+    return int(loud_frames[0])
+
+
+def bank_key(root: str, path: str) -> str:
+    return Path(os.path.relpath(os.path.abspath(path), os.path.abspath(root))).as_posix()
+
+
+class SoundBank:
+    def __init__(self, path: str, root: str, entries: dict[str, dict], data: mmap.mmap):
+        self.path = path
+        self.root = root
+        self._entries = entries
+        self._mmap = data
+        self._view = memoryview(data)
+        self.closed = False
+
+    @classmethod
+    def open(cls, path: str, root: str) -> Optional["SoundBank"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as bank_file:
+                data = mmap.mmap(bank_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            logger.warning("Failed to open sound bank (%s): %s", path, e)
+            return None
+
+        entries = _read_index(data)
+        if entries is None:
+            logger.warning("Ignoring invalid sound bank file: %s", path)
+            data.close()
+            return None
+        return cls(path, root, entries, data)
+
+    @property
+    def entries(self) -> dict[str, dict]:
+        return self._entries
+
+    def filenames_in(self, folder: str) -> list[str]:
+        prefix = f"{folder.strip('/')}/"
+        return sorted(
+            key[len(prefix):]
+            for key in self._entries
+            if key.startswith(prefix) and "/" not in key[len(prefix):]
+        )
+
+    def lookup(self, path: str) -> Optional[dict]:
+        entry = self._entries.get(bank_key(self.root, path))
+        if not entry:
+            return None
+        fingerprint = file_fingerprint(path)
+        if fingerprint is not None and fingerprint != (entry["mtime_ns"], entry["size"]):
+            return None
+        return entry
+
+    def pcm(self, entry: dict) -> memoryview:
+        start = entry["offset"]
+        return self._view[start:start + entry["pcm_bytes"]]
+
+    def trim_offset(self, entry: dict) -> int:
+        return entry["lead_silence_frames"] * FRAME_SIZE
+
+    def close(self) -> bool:
+        # Amig egy lejatszo meg a bankbol kiadott memoryview-t tartja, az mmap nem zarhato; ilyenkor False.
+        if self.closed:
+            return True
+        try:
+            self._view.release()
+            self._mmap.close()
+        except BufferError:
+            self._view = memoryview(self._mmap)
+            return False
+        self.closed = True
+        return True
+
+
+def _read_index(data) -> Optional[dict[str, dict]]:
+    if len(data) < SOUND_BANK_HEADER.size:
+        return None
+    magic, version, index_length = SOUND_BANK_HEADER.unpack_from(data, 0)
+    if magic != SOUND_BANK_MAGIC or version != SOUND_BANK_VERSION:
+        return None
+    index_start = SOUND_BANK_HEADER.size
+    index_end = index_start + index_length
+    if index_end > len(data):
+        return None
+    try:
+        raw_entries = json.loads(bytes(data[index_start:index_end]).decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return None
+    if not isinstance(raw_entries, list):
+        return None
+
+    entries = {}
+    for raw_entry in raw_entries:
+        if not isinstance(raw_entry, dict) or not raw_entry.get("key"):
+            continue
+        if raw_entry.get("offset", 0) + raw_entry.get("pcm_bytes", 0) > len(data):
+            continue
+        entries[str(raw_entry["key"])] = raw_entry
+    return entries
+
+
+def _collect_sources(root: str, folders: Iterable[str]) -> list[tuple[str, str]]:
+    sources = []
+    for folder in folders:
+        folder_path = os.path.join(root, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        for filename in sorted(os.listdir(folder_path)):
+            if filename.lower().endswith(SFX_FILE_EXTENSIONS):
+                file_path = os.path.join(folder_path, filename)
+                sources.append((bank_key(root, file_path), file_path))
+    return sources
+
+
+def build_sound_bank(
+    bank_path: str,
+    root: str,
+    folders: Iterable[str] = SOUND_BANK_FOLDERS,
+) -> dict:
+    previous = SoundBank.open(bank_path, root)
+    try:
+        return _write_sound_bank(bank_path, root, folders, previous)
+    finally:
+        if previous:
+            previous.close()
+
+
+def _write_sound_bank(
+    bank_path: str,
+    root: str,
+    folders: Iterable[str],
+    previous: Optional[SoundBank],
+) -> dict:
+    previous_entries = previous.entries if previous else {}
+    stats = {"reused": 0, "decoded": 0, "failed": 0, "removed": 0, "written": False}
+
+    clips = []
+    for key, file_path in _collect_sources(root, folders):
+        fingerprint = file_fingerprint(file_path)
+        if fingerprint is None:
+            continue
+        old_entry = previous_entries.get(key)
+        if old_entry and (old_entry["mtime_ns"], old_entry["size"]) == fingerprint:
+            clips.append((key, fingerprint, old_entry, None))
+            stats["reused"] += 1
+            continue
+        try:
+            pcm = decode_to_pcm(file_path)
+        except (OSError, subprocess.SubprocessError, RuntimeError) as e:
+            logger.warning("Sound bank decode failed (%s): %s", file_path, e)
+            stats["failed"] += 1
+            continue
+        clips.append((key, fingerprint, None, pcm))
+        stats["decoded"] += 1
+
+    kept_keys = {clip[0] for clip in clips}
+    stats["removed"] = len(set(previous_entries) - kept_keys)
+    if previous and not stats["decoded"] and not stats["removed"]:
+        return stats
+
+    index = []
+    for key, fingerprint, old_entry, pcm in clips:
+        pcm_bytes = old_entry["pcm_bytes"] if old_entry else len(pcm)
+        index.append(
+            {
+                "key": key,
+                "offset": 0,
+                "pcm_bytes": pcm_bytes,
+                "frames": count_frames(pcm_bytes),
+                "lead_silence_frames": (
+                    old_entry["lead_silence_frames"]
+                    if old_entry
+                    else count_leading_silence_frames(pcm)
+                ),
+                "mtime_ns": fingerprint[0],
+                "size": fingerprint[1],
+            }
+        )
+
+    # Az offsetek az index hosszatol fuggnek, ezert addig igazitunk, amig stabil nem lesz.
+    data_start = 0
+    while True:
+        cursor = data_start
+        for entry in index:
+            entry["offset"] = cursor
+            cursor = _align(cursor + entry["pcm_bytes"])
+        index_blob = json.dumps(index, separators=(",", ":")).encode("utf-8")
+        required_start = _align(SOUND_BANK_HEADER.size + len(index_blob))
+        if required_start == data_start:
+            break
+        data_start = required_start
+
+    temp_path = f"{bank_path}.tmp"
+    with open(temp_path, "wb") as bank_file:
+        bank_file.write(SOUND_BANK_HEADER.pack(SOUND_BANK_MAGIC, SOUND_BANK_VERSION, len(index_blob)))
+        bank_file.write(index_blob)
+        for entry, (_, _, old_entry, pcm) in zip(index, clips):
+            bank_file.seek(entry["offset"])
+            if old_entry:
+                bank_file.write(previous.pcm(old_entry))
+            else:
+                bank_file.write(pcm)
+        bank_file.truncate(max(data_start, bank_file.tell()))
+        bank_file.flush()
+        os.fsync(bank_file.fileno())
+    os.replace(temp_path, bank_path)
+    stats["written"] = True
+    logger.info(
+        "Sound bank written. path=%s clips=%s reused=%s decoded=%s removed=%s failed=%s",
+        bank_path,
+        len(index),
+        stats["reused"],
+        stats["decoded"],
+        stats["removed"],
+        stats["failed"],
+    )
+    return stats
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    default_root = str(Path(__file__).resolve().parent.parent)
+    parser = argparse.ArgumentParser(description="Pre-decoded PCM sound bank builder")
+    parser.add_argument("--root", default=default_root)
+    parser.add_argument("--bank", default=None)
+    parser.add_argument("folders", nargs="*", default=list(SOUND_BANK_FOLDERS))
+    args = parser.parse_args(argv)
+    bank_path = args.bank or os.path.join(args.root, "sound_bank.bin")
+    stats = build_sound_bank(bank_path, args.root, args.folders)
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
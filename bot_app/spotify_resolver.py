@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from bot_app.logging_setup import get_logger
+
+
+logger = get_logger(__name__)
+
+SPOTIFY_CACHE_VERSION = 1
+SPOTIFY_TRACK_ID_PATTERN = re.compile(r"(?:spotify\.com/(?:intl-[\w-]+/)?track/|spotify:track:)([A-Za-z0-9]+)")
+
+
+def spotify_track_id(url: str) -> Optional[str]:
+    match = SPOTIFY_TRACK_ID_PATTERN.search(url or "")
+    return match.group(1) if match else None
+
+
+class SpotifyResolver:
+    # Spotify szam -> "eloado - cim" feloldas az event loopon kivul. A spotipy kliens (es a benne
+    # tarolt client-credentials token) kozos; egyetlen szal hivja, igy a token frissites sem versenyez.
+    def __init__(
+        self,
+        client,
+        path: Optional[str],
+        *,
+        ttl_seconds: int,
+        max_entries: int,
+        timeout_seconds: float,
+    ):
+        self.client = client
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.timeout_seconds = timeout_seconds
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spotify")
+        self._pending: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self._entries = self._load()
+
+    def _load(self) -> dict[str, dict]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as cache_file:
+                data = json.load(cache_file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Failed to load Spotify cache: %s", e)
+            return {}
+        if not isinstance(data, dict) or data.get("version") != SPOTIFY_CACHE_VERSION:
+            return {}
+        entries = data.get("tracks") if isinstance(data.get("tracks"), dict) else {}
+        return {
+            str(track_id): entry
+            for track_id, entry in entries.items()
+            if isinstance(entry, dict) and entry.get("query")
+        }
+
+    def _save_locked(self) -> None:
+        now = time.time()
+        for track_id in [
+            track_id for track_id, entry in self._entries.items() if now - entry.get("stored_at", 0) > self.ttl_seconds
+        ]:
+            del self._entries[track_id]
+        overflow = len(self._entries) - self.max_entries
+        if overflow > 0:
+            for track_id in sorted(self._entries, key=lambda key: self._entries[key].get("last_used", 0))[:overflow]:
+                del self._entries[track_id]
+        if not self.path:
+            return
+        payload = {"version": SPOTIFY_CACHE_VERSION, "tracks": self._entries}
+        temp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as cache_file:
+                json.dump(payload, cache_file, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning("Failed to save Spotify cache: %s", e)
+
+    def _lookup(self, track_id: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(track_id)
+            if entry is not None and now - entry.get("stored_at", 0) > self.ttl_seconds:
+                del self._entries[track_id]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry["last_used"] = now
+            return entry["query"]
+
+    def _fetch(self, track_id: str) -> str:
+        # Blokkolo spotipy HTTP hivas; csak a sajat executor szalan fut.
+        track = self.client.track(track_id)
+        query = f"{track['artists'][0]['name']} - {track['name']}"
+        now = time.time()
+        with self._lock:
+            self._entries[track_id] = {"query": query, "stored_at": now, "last_used": now}
+            self._save_locked()
+        return query
+
+    async def resolve(self, url: str) -> str:
+        track_id = spotify_track_id(url)
+        if track_id is None:
+            raise ValueError(f"Nem Spotify szam link: {url}")
+        query = self._lookup(track_id)
+        if query is not None:
+            return query
+
+        # Ugyanarra a szamra egyszerre erkezo keresek egyetlen API hivast varnak.
+        pending = self._pending.get(track_id)
+        if pending is None:
+            pending = asyncio.get_running_loop().run_in_executor(self._executor, self._fetch, track_id)
+            self._pending[track_id] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(track_id, None))
+        try:
+            return await asyncio.wait_for(asyncio.shield(pending), timeout=self.timeout_seconds)
+        except asyncio.TimeoutError as e:
+            raise RuntimeError("A Spotify nem valaszolt idoben.") from e
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
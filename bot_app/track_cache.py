@@ -0,0 +1,290 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Optional
+
+from bot_app.logging_setup import get_logger
+
+
+logger = get_logger(__name__)
+
+TRACK_CACHE_INDEX_VERSION = 1
+TRACK_CACHE_INDEX_FILENAME = "index.json"
+TRACK_CACHE_PARTIAL_SUFFIX = ".part"
+# Hibrid LRU/LFU: minden korabbi talalat ennyivel "fiatalabbnak" mutatja a bejegyzest, legfeljebb N-szer.
+TRACK_CACHE_HIT_BONUS_SECONDS = 6 * 3600
+TRACK_CACHE_MAX_HIT_BONUS = 10
+# A talalatok csak a hasznalati adatokat frissitik; ezeket a flush() idozitve irja ki.
+TRACK_CACHE_FLUSH_INTERVAL_SECONDS = 60
+# Csak a lejatszashoz kello metaadat kerul az indexbe, nem a teljes yt-dlp info.
+TRACK_CACHE_INFO_FIELDS = (
+    "id",
+    "extractor_key",
+    "title",
+    "duration",
+    "acodec",
+    "ext",
+    "uploader",
+    "webpage_url",
+)
+
+_YOUTUBE_ID_REGEX = re.compile(
+    r"(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/)|youtu\.be/)([A-Za-z0-9_-]{11})"
+)
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def track_cache_key(extractor: Optional[str], video_id: Optional[str]) -> Optional[str]:
+    if not extractor or not video_id:
+        return None
+    return f"{str(extractor).lower()}:{video_id}"
+
+
+def track_cache_key_from_info(info: Optional[dict]) -> Optional[str]:
+    if not info:
+        return None
+    return track_cache_key(info.get("extractor_key") or info.get("extractor"), info.get("id"))
+
+
+def track_cache_key_from_url(url: str) -> Optional[str]:
+    # Halozat nelkul csak a YouTube linkekbol tudunk kulcsot kepezni, a tobbit az alias tabla adja.
+    match = _YOUTUBE_ID_REGEX.search(url or "")
+    if not match:
+        return None
+    return track_cache_key("youtube", match.group(1))
+
+
+class TrackCache:
+    def __init__(self, cache_dir: str, *, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max(0, max_bytes)
+        self.index_path = os.path.join(cache_dir, TRACK_CACHE_INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._pins: dict[str, int] = {}
+        # Lejatszas kozben lecserelt fajlok (pl. hangerore kodolas utan); az utolso unpin torli oket.
+        self._replaced_files: dict[str, list[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stored = 0
+        self._dirty = False
+        # entries: kulcs -> fajl + metaadat + hasznalat; aliases: mar latott URL -> kulcs.
+        self._entries, self._aliases = self._load_index()
+        self._drop_partial_files()
+
+    def _load_index(self) -> tuple[dict[str, dict], dict[str, str]]:
+        if not os.path.exists(self.index_path):
+            return {}, {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                data = json.load(index_file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Failed to load track cache index: %s", e)
+            return {}, {}
+        if not isinstance(data, dict) or data.get("version") != TRACK_CACHE_INDEX_VERSION:
+            return {}, {}
+        entries = data.get("entries") if isinstance(data.get("entries"), dict) else {}
+        aliases = data.get("aliases") if isinstance(data.get("aliases"), dict) else {}
+        entries = {
+            str(key): value
+            for key, value in entries.items()
+            if isinstance(value, dict) and os.path.exists(self._entry_path(value))
+        }
+        aliases = {str(url): str(key) for url, key in aliases.items() if key in entries}
+        return entries, aliases
+
+    def _drop_partial_files(self) -> None:
+        if not os.path.isdir(self.cache_dir):
+            return
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(TRACK_CACHE_PARTIAL_SUFFIX):
+                try:
+                    os.remove(os.path.join(self.cache_dir, filename))
+                except OSError:
+                    pass
+
+    def _save_index_locked(self) -> None:
+        self._dirty = False
+        payload = {
+            "version": TRACK_CACHE_INDEX_VERSION,
+            "entries": self._entries,
+            "aliases": self._aliases,
+        }
+        temp_path = f"{self.index_path}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as index_file:
+                json.dump(payload, index_file, indent=2, ensure_ascii=False)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            logger.warning("Failed to save track cache index: %s", e)
+
+    def _entry_path(self, entry: dict) -> str:
+        return os.path.join(self.cache_dir, str(entry.get("file") or ""))
+
+    def resolve_key(self, url: str) -> Optional[str]:
+        with self._lock:
+            key = self._aliases.get(url)
+        return key or track_cache_key_from_url(url)
+
+    def remember_url(self, url: str, key: str) -> None:
+        with self._lock:
+            if key not in self._entries or self._aliases.get(url) == key:
+                return
+            self._aliases[url] = key
+            self._save_index_locked()
+
+    def lookup(self, key: Optional[str], *, count: bool = True) -> Optional[dict]:
+        # count=False: a hivo egy feloldas tobb lepese utan maga szamol egyszer (record_lookup).
+        with self._lock:
+            entry = self._entries.get(key) if key else None
+            if entry is not None and not os.path.exists(self._entry_path(entry)):
+                self._forget_locked(key)
+                self._save_index_locked()
+                entry = None
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return None
+            if count:
+                self.hits += 1
+            entry["hits"] = int(entry.get("hits", 0)) + 1
+            entry["last_used"] = int(time.time())
+            self._dirty = True
+            return {**entry, "key": key, "path": self._entry_path(entry), "info": dict(entry.get("info") or {})}
+
+    def record_lookup(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def peek(self, key: str) -> Optional[dict]:
+        # Mint a lookup, de nem szamit hasznalatnak (nincs talalat szamlalas, LRU frissites).
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return {**entry, "key": key, "path": self._entry_path(entry), "info": dict(entry.get("info") or {})}
+
+    def store(
+        self, key: str, source_path: str, info: Optional[dict] = None, *, level: Optional[dict] = None
+    ) -> dict:
+        # A letoltott fajlt .part neven masoljuk/mozgatjuk a cache-be, es csak a kesz fajl kap vegleges nevet.
+        # level: a fajlba beegetett zenei hangero (gain, music_volume); ilyenkor kulon fajlnevet kap.
+        extension = os.path.splitext(source_path)[1] or ".audio"
+        filename = _UNSAFE_FILENAME_CHARS.sub("_", key) + (".level" if level else "") + extension
+        final_path = os.path.join(self.cache_dir, filename)
+        partial_path = f"{final_path}{TRACK_CACHE_PARTIAL_SUFFIX}"
+        os.makedirs(self.cache_dir, exist_ok=True)
+        try:
+            os.replace(source_path, partial_path)
+        except OSError:
+            # Masik fajlrendszer (pl. Docker volume): masolas, utana a forras torlese.
+            shutil.copyfile(source_path, partial_path)
+            os.remove(source_path)
+        os.replace(partial_path, final_path)
+
+        now = int(time.time())
+        info = {field: (info or {}).get(field) for field in TRACK_CACHE_INFO_FIELDS}
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous and previous.get("file") != filename:
+                if key in self._pins:
+                    self._replaced_files.setdefault(key, []).append(self._entry_path(previous))
+                else:
+                    self._remove_file(self._entry_path(previous))
+            entry = {
+                "file": filename,
+                "size": os.path.getsize(final_path),
+                "info": info,
+                "created_at": now,
+                "last_used": now,
+                "hits": int((previous or {}).get("hits", 0)),
+            }
+            if level:
+                entry["level"] = dict(level)
+            self._entries[key] = entry
+            self.stored += 1
+            self._evict_locked(keep=key)
+            self._save_index_locked()
+            logger.info("Track cached. key=%s size=%s file=%s", key, entry["size"], filename)
+            return {**entry, "key": key, "path": final_path, "info": dict(info)}
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._dirty:
+                self._save_index_locked()
+
+    def pin(self, key: str) -> None:
+        # Lejatszas alatt a fajl nem eviktalhato.
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + 1
+
+    def unpin(self, key: str) -> None:
+        with self._lock:
+            remaining = self._pins.get(key, 0) - 1
+            if remaining > 0:
+                self._pins[key] = remaining
+                return
+            self._pins.pop(key, None)
+            replaced_files = self._replaced_files.pop(key, [])
+        for path in replaced_files:
+            self._remove_file(path)
+
+    def _total_bytes_locked(self) -> int:
+        return sum(int(entry.get("size", 0)) for entry in self._entries.values())
+
+    def _eviction_score(self, entry: dict) -> float:
+        hit_bonus = min(int(entry.get("hits", 0)), TRACK_CACHE_MAX_HIT_BONUS) * TRACK_CACHE_HIT_BONUS_SECONDS
+        return float(entry.get("last_used", 0)) + hit_bonus
+
+    def _evict_locked(self, *, keep: Optional[str] = None) -> None:
+        total_bytes = self._total_bytes_locked()
+        if total_bytes <= self.max_bytes:
+            return
+        candidates = sorted(
+            (key for key in self._entries if key != keep and key not in self._pins),
+            key=lambda key: self._eviction_score(self._entries[key]),
+        )
+        for key in candidates:
+            if total_bytes <= self.max_bytes:
+                break
+            total_bytes -= int(self._entries[key].get("size", 0))
+            self._forget_locked(key)
+            self.evictions += 1
+            logger.info("Track cache evicted. key=%s", key)
+
+    def _forget_locked(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._remove_file(self._entry_path(entry))
+        self._aliases = {url: alias_key for url, alias_key in self._aliases.items() if alias_key != key}
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Track cache file removal failed (%s): %s", path, e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes_locked(),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "stored": self.stored,
+                "evictions": self.evictions,
+                "pinned": len(self._pins),
+            }
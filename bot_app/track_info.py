@@ -0,0 +1,63 @@
+from typing import Optional
+
+
+class TrackInfo:
+    # A yt-dlp info dict (formatumok, thumbnailek, headerek - gyakran tobb szaz KB) helyett
+    # csak a bot altal hasznalt mezok; __slots__ miatt nincs peldanyonkenti __dict__ sem.
+    __slots__ = (
+        "title",
+        "id",
+        "extractor",
+        "url",
+        "headers",
+        "duration",
+        "uploader",
+        "acodec",
+        "webpage_url",
+        "is_live",
+    )
+
+    def __init__(
+        self,
+        *,
+        title: Optional[str] = None,
+        id: Optional[str] = None,
+        extractor: Optional[str] = None,
+        url: Optional[str] = None,
+        headers: Optional[dict] = None,
+        duration: Optional[float] = None,
+        uploader: Optional[str] = None,
+        acodec: Optional[str] = None,
+        webpage_url: Optional[str] = None,
+        is_live: bool = False,
+    ):
+        self.title = title or "Ismeretlen cim"
+        self.id = id
+        self.extractor = extractor
+        self.url = url
+        self.headers = headers or None
+        self.duration = duration
+        self.uploader = uploader
+        self.acodec = acodec
+        self.webpage_url = webpage_url
+        self.is_live = is_live
+
+    @classmethod
+    def from_info(cls, info: Optional[dict]) -> "TrackInfo":
+        info = info or {}
+        headers = info.get("http_headers")
+        return cls(
+            title=info.get("title"),
+            id=info.get("id"),
+            extractor=info.get("extractor_key") or info.get("extractor"),
+            url=info.get("url"),
+            headers=dict(headers) if isinstance(headers, dict) else None,
+            duration=info.get("duration"),
+            uploader=info.get("uploader"),
+            acodec=info.get("acodec"),
+            webpage_url=info.get("webpage_url"),
+            is_live=bool(info.get("is_live")),
+        )
+
+    def __repr__(self) -> str:
+        return f"TrackInfo(title={self.title!r}, id={self.id!r}, extractor={self.extractor!r})"
@@ -0,0 +1,116 @@
+import itertools
+import random
+from collections import deque
+from typing import Iterator, Optional
+
+
+class TrackQueueFull(RuntimeError):
+    pass
+
+
+class DuplicateTrack(ValueError):
+    def __init__(self, position: int):
+        super().__init__(f"A szam mar a sorban van (#{position}).")
+        self.position = position
+
+
+def track_identity(track) -> Optional[str]:
+    return getattr(track, "identity", None)
+
+
+class GuildTrackQueue:
+    # Egy guild lejatszasi sora: deque (O(1) sorba allitas / kivetel) es bejegyzes id -> szam index,
+    # a duplikacio-szurest pedig egy identitas -> darabszam tabla adja.
+    def __init__(self, *, max_length: int):
+        self.max_length = max(1, max_length)
+        self._entries: deque[int] = deque()
+        self._tracks: dict[int, object] = {}
+        self._identities: dict[str, int] = {}
+        self._ids = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __bool__(self) -> bool:
+        return bool(self._entries)
+
+    def __iter__(self) -> Iterator:
+        return (self._tracks[entry_id] for entry_id in self._entries)
+
+    def _forget(self, entry_id: int):
+        track = self._tracks.pop(entry_id)
+        identity = track_identity(track)
+        if identity is not None:
+            remaining = self._identities.get(identity, 0) - 1
+            if remaining > 0:
+                self._identities[identity] = remaining
+            else:
+                self._identities.pop(identity, None)
+        return track
+
+    def position_of(self, track) -> Optional[int]:
+        identity = track_identity(track)
+        if identity is None or identity not in self._identities:
+            return None
+        for position, queued in enumerate(self, start=1):
+            if track_identity(queued) == identity:
+                return position
+        return None
+
+    def append(self, track, *, allow_duplicate: bool = False) -> int:
+        if len(self._entries) >= self.max_length:
+            raise TrackQueueFull(f"A lejatszasi lista megtelt ({self.max_length} szam).")
+        if not allow_duplicate:
+            position = self.position_of(track)
+            if position is not None:
+                raise DuplicateTrack(position)
+        entry_id = next(self._ids)
+        self._entries.append(entry_id)
+        self._tracks[entry_id] = track
+        identity = track_identity(track)
+        if identity is not None:
+            self._identities[identity] = self._identities.get(identity, 0) + 1
+        return len(self._entries)
+
+    def peek(self):
+        if not self._entries:
+            return None
+        return self._tracks[self._entries[0]]
+
+    def popleft(self):
+        if not self._entries:
+            return None
+        return self._forget(self._entries.popleft())
+
+    def _check_position(self, position: int) -> None:
+        if not 1 <= position <= len(self._entries):
+            raise IndexError(f"Nincs {position}. szam a listaban (1-{len(self._entries)}).")
+
+    def remove(self, position: int):
+        self._check_position(position)
+        entry_id = self._entries[position - 1]
+        del self._entries[position - 1]
+        return self._forget(entry_id)
+
+    def move(self, from_position: int, to_position: int):
+        self._check_position(from_position)
+        self._check_position(to_position)
+        entry_id = self._entries[from_position - 1]
+        del self._entries[from_position - 1]
+        self._entries.insert(to_position - 1, entry_id)
+        return self._tracks[entry_id]
+
+    def shuffle(self, rng: Optional[random.Random] = None) -> None:
+        entries = list(self._entries)
+        (rng or random).shuffle(entries)
+        self._entries = deque(entries)
+
+    def clear(self) -> list:
+        tracks = list(self)
+        self._entries.clear()
+        self._tracks.clear()
+        self._identities.clear()
+        return tracks
+
+    def titles(self) -> list[str]:
+        return [getattr(track, "title", "?") for track in self]
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import subprocess
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from typing import Hashable, Optional
+
+from bot_app.logging_setup import get_logger
+
+
+logger = get_logger(__name__)
+
+# A worker nem a bot belepesi pontjat (bot.py) importalja ujra, hanem ezt a csak yt_dlp-t hasznalo scriptet.
+YTDL_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ytdl_worker.py")
+YTDL_WORKER_KILL_TIMEOUT_SECONDS = 2
+
+
+class _YTDLWorker:
+    def __init__(self, options: dict):
+        jobs_read, jobs_write = os.pipe()
+        results_read, results_write = os.pipe()
+        try:
+            self.process = subprocess.Popen(
+                [sys.executable, YTDL_WORKER_SCRIPT, str(jobs_read), str(results_write)],
+                pass_fds=(jobs_read, results_write),
+                stdin=subprocess.DEVNULL,
+            )
+        except BaseException:
+            for fd in (jobs_read, jobs_write, results_read, results_write):
+                os.close(fd)
+            raise
+        os.close(jobs_read)
+        os.close(results_write)
+        self.jobs = Connection(jobs_write, readable=False)
+        self.results = Connection(results_read, writable=False)
+        self.jobs.send(options)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def call(self, job: tuple):
+        # Blokkolo, az io szalon fut; ha kozben megoljuk a folyamatot, a recv EOFError-ral ter vissza.
+        self.jobs.send(job)
+        return self.results.recv()
+
+    def kill(self) -> None:
+        # Blokkolo (wait); executorban fut, nem az event loopon.
+        if self.process.poll() is None:
+            self.process.kill()
+        try:
+            self.process.wait(YTDL_WORKER_KILL_TIMEOUT_SECONDS)
+        except subprocess.TimeoutExpired:
+            logger.warning("yt-dlp worker did not exit after kill. pid=%s", self.process.pid)
+        self.jobs.close()
+        self.results.close()
+
+
+class YTDLProcessPool:
+    # Korlatos szamu, meleg yt-dlp worker folyamat. A munkak guildenkent sorba allnak es a guildek
+    # korbe kapnak workert, igy egy lassu letoltes nem eheztet ki mindenki mast. A hatter (cache)
+    # letoltesek kulon, alacsonyabb prioritasu sorban varnak: csak akkor kapnak workert, ha nincs varo
+    # elotter munka, es egyszerre legfeljebb max_background_workers fut beloluk. A megszakitott
+    # (timeout, cancel) munka workeret megoljuk, a helyere szukseg eseten uj indul.
+    def __init__(self, options: dict, *, max_workers: int, max_background_workers: Optional[int] = None):
+        self.options = options
+        self.max_workers = max(1, max_workers)
+        # Alapbol egy worker mindig az elotter (kereses, lejatszas inditas) szamara marad.
+        if max_background_workers is None:
+            max_background_workers = self.max_workers - 1
+        self.max_background_workers = min(self.max_workers, max(1, max_background_workers))
+        self._idle: list[_YTDLWorker] = []
+        self._assigned = 0
+        self._background_assigned = 0
+        self._waiting: dict[Hashable, deque[asyncio.Future]] = {}
+        self._background_waiting: dict[Hashable, deque[asyncio.Future]] = {}
+        # Guild -> utoljara kiszolgalt sorszam; mindig a legregebben kiszolgalt varakozo guild kovetkezik.
+        self._served: dict[Hashable, int] = {}
+        self._dispatches = 0
+        self._io = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ytdl-pool-io")
+        self.spawned = 0
+        self.completed = 0
+        self.failed = 0
+        self.killed = 0
+        self.peak_queue_depth = 0
+
+    def _spawn(self) -> _YTDLWorker:
+        self.spawned += 1
+        return _YTDLWorker(self.options)
+
+    @staticmethod
+    def _depth(waiting: dict[Hashable, deque[asyncio.Future]]) -> int:
+        return sum(1 for waiters in waiting.values() for ticket in waiters if not ticket.done())
+
+    def queue_depth(self) -> int:
+        return self._depth(self._waiting)
+
+    def _next_ticket(self) -> Optional[tuple[asyncio.Future, bool]]:
+        if self._waiting:
+            waiting, background = self._waiting, False
+        elif self._background_waiting and self._background_assigned < self.max_background_workers:
+            waiting, background = self._background_waiting, True
+        else:
+            return None
+        guild_key = min(waiting, key=lambda key: self._served.get(key, 0))
+        waiters = waiting[guild_key]
+        ticket = waiters.popleft()
+        if not waiters:
+            del waiting[guild_key]
+        if not ticket.done():
+            self._dispatches += 1
+            self._served[guild_key] = self._dispatches
+        return ticket, background
+
+    def _dispatch(self) -> None:
+        while self._idle or self._assigned < self.max_workers:
+            next_ticket = self._next_ticket()
+            if next_ticket is None:
+                return
+            ticket, background = next_ticket
+            if ticket.done():
+                continue
+            worker = self._idle.pop() if self._idle else None
+            while worker is not None and not worker.alive:
+                self._retire(worker)
+                worker = self._idle.pop() if self._idle else None
+            if worker is None:
+                try:
+                    worker = self._spawn()
+                except Exception as e:
+                    ticket.set_exception(RuntimeError(f"Nem sikerult yt-dlp workert inditani: {e}"))
+                    continue
+            self._assigned += 1
+            if background:
+                self._background_assigned += 1
+            ticket.set_result(worker)
+
+    def _retire(self, worker: _YTDLWorker) -> None:
+        asyncio.get_running_loop().run_in_executor(None, worker.kill)
+
+    def _release(self, worker: _YTDLWorker, *, reusable: bool, background: bool) -> None:
+        self._assigned -= 1
+        if background:
+            self._background_assigned -= 1
+        if reusable and worker.alive:
+            self._idle.append(worker)
+        else:
+            self._retire(worker)
+        self._dispatch()
+
+    async def _run(self, job: tuple, *, guild_id: Optional[Hashable], label: str, background: bool = False):
+        loop = asyncio.get_running_loop()
+        ticket = loop.create_future()
+        waiting = self._background_waiting if background else self._waiting
+        waiting.setdefault(guild_id, deque()).append(ticket)
+        if not background:
+            self.peak_queue_depth = max(self.peak_queue_depth, self.queue_depth())
+        self._dispatch()
+        try:
+            worker = await ticket
+        except asyncio.CancelledError:
+            if ticket.done() and not ticket.cancelled():
+                self._release(ticket.result(), reusable=True, background=background)
+            raise
+
+        reusable = False
+        try:
+            ok, result = await loop.run_in_executor(self._io, worker.call, job)
+            reusable = True
+        except asyncio.CancelledError:
+            self.killed += 1
+            logger.warning("yt-dlp job cancelled, killing worker. guild=%s job=%s", guild_id, label)
+            raise
+        except (EOFError, OSError) as e:
+            self.failed += 1
+            raise RuntimeError("A yt-dlp worker varatlanul leallt.") from e
+        finally:
+            self._release(worker, reusable=reusable, background=background)
+        if not ok:
+            self.failed += 1
+            raise RuntimeError(result)
+        self.completed += 1
+        return result
+
+    async def extract_info(
+        self,
+        url: str,
+        *,
+        download: bool = False,
+        guild_id: Optional[Hashable] = None,
+        background: bool = False,
+    ) -> Optional[dict]:
+        return await self._run(("extract", (url, download)), guild_id=guild_id, label=url, background=background)
+
+    async def process_ie_result(
+        self, info: dict, *, guild_id: Optional[Hashable] = None, background: bool = False
+    ) -> Optional[dict]:
+        label = info.get("webpage_url") or info.get("title") or "?"
+        return await self._run(("process", info), guild_id=guild_id, label=label, background=background)
+
+    def snapshot(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_background_workers": self.max_background_workers,
+            "busy": self._assigned,
+            "background_busy": self._background_assigned,
+            "idle": len(self._idle),
+            "queue_depth": self.queue_depth(),
+            "peak_queue_depth": self.peak_queue_depth,
+            "queue_by_guild": {
+                str(guild_key): sum(1 for ticket in waiters if not ticket.done())
+                for guild_key, waiters in self._waiting.items()
+            },
+            "background_queue_depth": self._depth(self._background_waiting),
+            "spawned": self.spawned,
+            "completed": self.completed,
+            "failed": self.failed,
+            "killed": self.killed,
+        }
@@ -0,0 +1,53 @@
+import sys
+from multiprocessing.connection import Connection
+
+import yt_dlp
+
+
+# Onallo belepesi pont a yt-dlp worker folyamatoknak: szandekosan csak a yt_dlp-t importalja,
+# a botot (discord, numpy, logging handlerek) nem. A YTDLProcessPool fajlutvonallal inditja.
+
+
+def run_job(ytdl: yt_dlp.YoutubeDL, operation: str, payload):
+    if operation == "extract":
+        url, download = payload
+        info = ytdl.extract_info(url, download=download)
+    elif operation == "process":
+        info = ytdl.process_ie_result(payload, download=True)
+    else:
+        raise ValueError(f"Unknown yt-dlp job: {operation}")
+    # A nyers info dict nem mindig picklezheto, a sanitize_info csak JSON-baratat hagy meg.
+    return ytdl.sanitize_info(info) if info is not None else None
+
+
+def serve(jobs: Connection, results: Connection) -> None:
+    try:
+        options = jobs.recv()
+    except (EOFError, OSError):
+        return
+    ytdl = yt_dlp.YoutubeDL(options)
+    while True:
+        try:
+            job = jobs.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+        operation, payload = job
+        try:
+            result = (True, run_job(ytdl, operation, payload))
+        except Exception as e:
+            result = (False, str(e) or type(e).__name__)
+        try:
+            results.send(result)
+        except (EOFError, OSError):
+            return
+
+
+def main(argv: list[str]) -> None:
+    jobs_fd, results_fd = int(argv[1]), int(argv[2])
+    serve(Connection(jobs_fd, writable=False), Connection(results_fd, readable=False))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
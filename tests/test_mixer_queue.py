@@ -0,0 +1,163 @@
+import asyncio
+import os
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+import discord
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+# A core importja a bot teljes konfiguraciojat betolti; a teszthez eleg a dummy ertek.
+os.environ.setdefault("SPOTIPY_CLIENT_ID", "test")
+os.environ.setdefault("SPOTIPY_CLIENT_SECRET", "test")
+os.environ.setdefault("BOT_LOG_DIR", os.path.join(tempfile.gettempdir(), "discord-bot-test-logs"))
+
+from bot_app import core  # noqa: E402
+from bot_app.mixing import FRAME_SIZE  # noqa: E402
+
+
+class ToneSource(discord.AudioSource):
+    def __init__(self, marker: int, frames: int):
+        self.frame = bytes([marker]) * FRAME_SIZE
+        self.frames_left = frames
+
+    def read(self) -> bytes:
+        if self.frames_left <= 0:
+            return b""
+        self.frames_left -= 1
+        return self.frame
+
+    def is_opus(self):
+        return False
+
+
+class QueueEntry:
+    def __init__(self, marker: int, frames: int):
+        self.marker = marker
+        self.frames = frames
+        self.title = f"track-{marker}"
+        self.builds = 0
+
+    def build_source(self, *, prefer_opus: bool = True):
+        self.builds += 1
+        return core.LocalFileSource(
+            ToneSource(self.marker, self.frames), title=self.title, volume=1.0, duration=self.frames / 50
+        )
+
+
+async def play_frames(mixer: core.MixingAudioSource, count: int) -> list[int]:
+    markers = []
+    for _ in range(count):
+        frame = mixer.read()
+        markers.append(frame[0])
+        # A reader es a pre-roll szalak ideje; a mixer itt nem valos idoben fut.
+        await asyncio.sleep(0.002)
+    return markers
+
+
+def run_with_mixer(scenario):
+    async def runner():
+        original_bot = core.bot
+        core.bot = types.SimpleNamespace(loop=asyncio.get_running_loop())
+        mixer = core.MixingAudioSource()
+        try:
+            return await scenario(mixer)
+        finally:
+            mixer.cleanup()
+            core.bot = original_bot
+
+    return asyncio.run(runner())
+
+
+def test_staged_track_follows_queue_source():
+    async def scenario(mixer):
+        queue_ends = []
+
+        async def on_end():
+            queue_ends.append(True)
+
+        current, staged = QueueEntry(1, 20), QueueEntry(2, 20)
+        mixer.set_main_source(current.build_source(), on_end=on_end)
+        mixer.set_next_source(staged)
+        markers = await play_frames(mixer, 120)
+        await asyncio.sleep(0)
+        owned = mixer.owns_source(staged)
+        mixer.set_main_source(None)
+        return markers, queue_ends, owned, mixer.owns_source(staged)
+
+    markers, queue_ends, owned, owned_after_stop = run_with_mixer(scenario)
+    assert 2 in markers
+    assert owned
+    assert not owned_after_stop
+    assert len(queue_ends) == 2
+
+
+def test_tts_interrupting_queue_does_not_promote_staged_track():
+    async def scenario(mixer):
+        queue_ends = []
+
+        async def on_end():
+            queue_ends.append(True)
+
+        current, queued = QueueEntry(1, 200), QueueEntry(2, 20)
+        mixer.set_main_source(current.build_source(), on_end=on_end)
+        await play_frames(mixer, 5)
+        # TTS (mondd / MQTT say_text): sor-callback nelkuli fo forras; kozben uj szam kerul a sorba.
+        mixer.set_main_source(core.LocalFileSource(ToneSource(3, 20), title="tts", volume=1.0))
+        mixer.set_next_source(queued)
+        markers = await play_frames(mixer, 120)
+        await asyncio.sleep(0)
+        return markers, queue_ends, queued, current, mixer
+
+    markers, queue_ends, queued, current, mixer = run_with_mixer(scenario)
+    assert 3 in markers
+    assert 2 not in markers
+    assert queued.builds == 0
+    assert queue_ends == []
+    assert not mixer.owns_source(queued)
+    assert not mixer.owns_source(current)
+    assert mixer.main_source is None
+
+
+def test_skip_promotes_prerolled_track():
+    async def scenario(mixer):
+        queue_ends = []
+
+        async def on_end():
+            queue_ends.append(True)
+
+        current, staged = QueueEntry(1, 20), QueueEntry(2, 200)
+        mixer.set_main_source(current.build_source(), on_end=on_end)
+        mixer.set_next_source(staged)
+        # A pre-roll ablakban a kovetkezo szam mar felepult, de a fo szam meg szol.
+        await play_frames(mixer, 5)
+        for _ in range(100):
+            if mixer._next_source is not None:
+                break
+            await asyncio.sleep(0.01)
+        skipped = mixer.skip_to_next()
+        markers = await play_frames(mixer, 10)
+        return skipped, markers, queue_ends, staged, mixer
+
+    skipped, markers, queue_ends, staged, mixer = run_with_mixer(scenario)
+    assert skipped
+    # Az elso frame eleje meg a limiter lookahead-jebol jon; utana mar csak az elore felepult szam szol.
+    assert set(markers[1:]) == {2}
+    assert staged.builds == 1
+    assert mixer.owns_source(staged)
+    assert queue_ends == []
+
+
+def test_skip_without_prerolled_track_stops_main_source():
+    async def scenario(mixer):
+        mixer.set_main_source(core.LocalFileSource(ToneSource(3, 200), title="tts", volume=1.0))
+        await play_frames(mixer, 5)
+        return mixer.skip_to_next(), mixer
+
+    skipped, mixer = run_with_mixer(scenario)
+    assert not skipped
+    assert mixer.main_source is None